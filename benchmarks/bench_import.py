@@ -0,0 +1,36 @@
+"""Time it takes to import sparrow, and to create each backend.
+
+Every measurement runs in a fresh interpreter.
+
+Usage::
+
+  > python benchmarks/bench_import.py [repeat]
+"""
+import subprocess
+import sys
+import time
+
+STATEMENTS = [
+    ('python', 'pass'),
+    ('import sparrow', 'import sparrow'),
+    ('rdflib backend', 'import sparrow; sparrow.get_backend("rdflib")'),
+    ('sesame backend', 'import sparrow; sparrow.get_backend("sesame")'),
+]
+
+
+def measure(statement, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', statement])
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(repeat=5):
+    for name, statement in STATEMENTS:
+        print('%-16s %6.1f ms' % (name, measure(statement, repeat) * 1000))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,234 @@
+"""Peak memory per triple of the conversions and backend methods.
+
+Every conversion in sparrow.utils, and the BaseBackend methods built on
+them, run under tracemalloc on inputs of growing size. The report lists
+the peak and the retained allocation per triple. The N-Triples block
+size is made small, as in the memory tests, and a peak that grows by
+less than ``SLOPE`` bytes per triple from the smallest to the largest
+size is marked as constant, whatever the sizes. The rdflib backend is
+used for the backend methods.
+
+The triples with blank nodes are left out of the datasets: parsers keep
+the labels of the blank nodes they met, which adds to the peak for every
+label, and would hide whether a conversion streams.
+
+With --baseline, the peaks are compared to an earlier output and the
+script exits with status 1 if any of them grew by more than the
+tolerance.
+
+Usage::
+
+  > python benchmarks/bench_memory.py [--triples 10000,40000]
+        [--output memory.json] [--baseline baseline.json]
+        [--tolerance 0.1]
+"""
+import argparse
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+from unittest import mock
+
+import simplejson
+
+import sparrow
+from sparrow import ntriples, utils
+
+from bench_sparql_results import make_results
+from bench_suite import make_dataset
+
+SELECT = """
+prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+select ?s ?p ?o where { ?s ?p ?o }
+"""
+
+# the N-Triples block size while measuring, and the largest growth of a
+# constant peak in bytes per triple
+BUFSIZ = 16 * 1024
+SLOPE = 8
+
+
+def measure(function):
+    """Returns the peak and the retained allocation of function"""
+    tracemalloc.start()
+    try:
+        result = function()
+        size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak, size
+
+
+def drain(file):
+    while file.read(64 * 1024):
+        pass
+
+
+def consume(iterable):
+    for item in iterable:
+        pass
+
+
+def conversions(nt):
+    """Yields (name, function) pairs of the conversions of nt"""
+    data = utils.ntriples_to_dict(BytesIO(nt))
+    json = utils.ntriples_to_json(BytesIO(nt)).read().encode('utf-8')
+    nquads = ''.join(utils.ntriples_to_nquads(BytesIO(nt), 'bench'))
+    nquads = nquads.encode('utf-8')
+    yield 'iter_triples', lambda: consume(ntriples.iter_triples(BytesIO(nt)))
+    yield 'ntriples_to_dict', lambda: utils.ntriples_to_dict(BytesIO(nt))
+    yield 'ntriples_to_dict/terms', lambda: utils.ntriples_to_dict(
+        BytesIO(nt), terms=utils.TermDict())
+    yield 'dict_to_ntriples', lambda: drain(utils.dict_to_ntriples(data))
+    yield 'ntriples_to_json', lambda: drain(
+        utils.ntriples_to_json(BytesIO(nt)))
+    yield 'json_to_ntriples', lambda: drain(
+        utils.json_to_ntriples(BytesIO(json)))
+    yield 'ntriples_to_nquads', lambda: consume(
+        utils.ntriples_to_nquads(BytesIO(nt), 'bench'))
+    yield 'nquads_to_ntriples', lambda: utils.nquads_to_ntriples(
+        BytesIO(nquads))
+    # the statements of a graph that are not read are skipped
+    yield 'iter_graphs', lambda: consume(utils.iter_graphs(BytesIO(nquads)))
+
+
+def sparql_results(rows):
+    xml = make_results(rows)['application/sparql-results+xml']
+    yield 'parse_sparql_result', lambda: utils.parse_sparql_result(xml)
+    for mimetype, data in make_results(rows).items():
+        parse = utils.SPARQL_RESULT_PARSERS[mimetype]
+        yield parse.__name__, lambda: consume(parse(BytesIO(data)))
+
+
+def backend_methods(nt):
+    db = sparrow.database('rdflib', 'memory')
+    db.add_ntriples(BytesIO(nt), 'bench')
+    data = db.get_dict('bench')
+    json = db.get_json('bench').read().encode('utf-8')
+    nquads = db.get_nquads().read().encode('utf-8')
+    yield 'get_json', lambda: drain(db.get_json('bench'))
+    yield 'get_dict', lambda: db.get_dict('bench')
+    yield 'get_columns', lambda: db.get_columns('bench')
+    yield 'get_nquads', lambda: drain(db.get_nquads())
+    yield 'select', lambda: db.select(SELECT)
+    yield 'select_columns', lambda: db.select_columns(SELECT)
+    for name, add in (('add_json', lambda: db.add_json(BytesIO(json), 'x')),
+                      ('add_dict', lambda: db.add_dict(data, 'x')),
+                      ('add_nquads', lambda: db.add_nquads(BytesIO(nquads)))):
+        # the store is emptied first, its growth is not retained
+        yield name, add
+        db.clear('x')
+        db.clear('bench')
+        db.add_ntriples(BytesIO(nt), 'bench')
+    db.disconnect()
+
+
+def groups(nt, triples):
+    return (('utils', conversions(nt)),
+            ('utils', sparql_results(triples)),
+            ('rdflib', backend_methods(nt)))
+
+
+def run(sizes):
+    results = {}
+    workdir = tempfile.mkdtemp()
+    patch = mock.patch.object(ntriples, 'bufsiz', BUFSIZ)
+    patch.start()
+    try:
+        # caches and lazy imports are filled before measuring, so they
+        # do not add to the peak of the first size only
+        path = os.path.join(workdir, 'warmup.nt')
+        triples = make_dataset(1000, path, bnodes=False)
+        with open(path, 'rb') as f:
+            nt = f.read()
+        for group, functions in groups(nt, triples):
+            for name, function in functions:
+                function()
+        for size in sizes:
+            path = os.path.join(workdir, '%d.nt' % size)
+            triples = make_dataset(size, path, bnodes=False)
+            with open(path, 'rb') as f:
+                nt = f.read()
+            for group, functions in groups(nt, triples):
+                for name, function in functions:
+                    peak, retained = measure(function)
+                    key = '%s/%s' % (group, name)
+                    results.setdefault(key, {})[str(triples)] = {
+                        'peak': peak, 'retained': retained,
+                        'peak_per_triple': peak / triples,
+                        'retained_per_triple': retained / triples}
+                    print('%-36s %9d %10.1f B/triple peak %10.1f retained' % (
+                        key, triples, peak / triples, retained / triples))
+    finally:
+        patch.stop()
+        shutil.rmtree(workdir)
+
+    for by_size in results.values():
+        sizes = sorted(by_size, key=int)
+        first, last = by_size[sizes[0]], by_size[sizes[-1]]
+        triples = int(sizes[-1]) - int(sizes[0])
+        slope = (last['peak'] - first['peak']) / triples if triples else 0
+        by_size['slope'] = slope
+        by_size['constant'] = slope < SLOPE
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Prints the changes against the baseline, returns the regressions"""
+    regressions = []
+    for key, sizes in sorted(results.items()):
+        for size, result in sorted(sizes.items()):
+            if size in ('constant', 'slope') or (
+                    size not in baseline.get(key, {})):
+                continue
+            before = baseline[key][size]['peak']
+            ratio = result['peak'] / before if before else 1.0
+            flag = ''
+            if ratio > 1 + tolerance:
+                regressions.append((key, size))
+                flag = '  REGRESSION'
+            print('%-36s %9s %12d -> %12d %+7.1f%%%s' % (
+                key, size, before, result['peak'], (ratio - 1) * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--triples', default='10000,40000',
+                        help='comma separated dataset sizes')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    results = run([int(size) for size in args.triples.split(',')])
+    print()
+    print('constant peak: %s' % ', '.join(
+        key for key, sizes in sorted(results.items()) if sizes['constant']))
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            simplejson.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = simplejson.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('%d regressions over %d%%' % (len(regressions),
+                                                args.tolerance * 100))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
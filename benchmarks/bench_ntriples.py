@@ -0,0 +1,43 @@
+"""Parse time and memory per triple of ntriples_to_dict.
+
+The wine ontology is repeated to get a larger input.
+
+Usage::
+
+  > python benchmarks/bench_ntriples.py [copies]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+from sparrow.utils import ntriples_to_dict, TermDict
+
+WINE = os.path.join(os.path.dirname(__file__), os.pardir,
+                    'src', 'sparrow', 'tests', 'wine.nt')
+
+
+def main(copies=20):
+    with open(WINE, 'rb') as f:
+        data = f.read() * copies
+    count = data.count(b'\n')
+
+    for name, terms in (('plain', None), ('interned', TermDict())):
+        start = time.perf_counter()
+        ntriples_to_dict(BytesIO(data), terms=terms)
+        seconds = time.perf_counter() - start
+
+        tracemalloc.start()
+        result = ntriples_to_dict(BytesIO(data), terms=terms)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+
+        print('ntriples_to_dict (%s): %d triples, %.0f triples/s, '
+              '%.0f bytes/triple retained, %.0f bytes/triple peak' % (
+                  name, count, count / seconds, size / count, peak / count))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,57 @@
+"""Decode time of SPARQL select results per result format.
+
+Usage::
+
+  > python benchmarks/bench_sparql_results.py [rows]
+"""
+import sys
+import time
+from io import BytesIO
+
+import simplejson
+
+from sparrow.utils import SPARQL_RESULT_PARSERS, XSD_NS
+
+
+def make_results(rows):
+    names = ('s', 'label', 'n')
+    xml = ['<?xml version="1.0"?>\n'
+           '<sparql xmlns="http://www.w3.org/2005/sparql-results#">'
+           '<head><variable name="s"/><variable name="label"/>'
+           '<variable name="n"/></head><results>']
+    tsv = ['?s\t?label\t?n\n']
+    bindings = []
+    for i in range(rows):
+        uri = 'http://example.org/wine/%d' % i
+        label = 'Wine number %d' % i
+        xml.append('<result><binding name="s"><uri>%s</uri></binding>'
+                   '<binding name="label"><literal xml:lang="en">%s</literal>'
+                   '</binding><binding name="n"><literal datatype="%sinteger">'
+                   '%d</literal></binding></result>' % (uri, label, XSD_NS, i))
+        tsv.append('<%s>\t"%s"@en\t%d\n' % (uri, label, i))
+        bindings.append({
+            's': {'type': 'uri', 'value': uri},
+            'label': {'type': 'literal', 'xml:lang': 'en', 'value': label},
+            'n': {'type': 'literal', 'datatype': XSD_NS + 'integer',
+                  'value': str(i)}})
+    xml.append('</results></sparql>')
+    json = simplejson.dumps({'head': {'vars': names},
+                             'results': {'bindings': bindings}})
+    return {'application/sparql-results+xml': ''.join(xml).encode('utf-8'),
+            'application/sparql-results+json': json.encode('utf-8'),
+            'text/tab-separated-values': ''.join(tsv).encode('utf-8')}
+
+
+def main(rows=100000):
+    for mimetype, data in make_results(rows).items():
+        parse = SPARQL_RESULT_PARSERS[mimetype]
+        start = time.perf_counter()
+        count = sum(1 for row in parse(BytesIO(data)))
+        seconds = time.perf_counter() - start
+        assert count == rows
+        print('%-32s %6.2f MB, %6.3f s per %d rows' % (
+            mimetype, len(data) / 1024 / 1024, seconds, rows))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
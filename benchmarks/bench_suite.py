@@ -0,0 +1,289 @@
+"""Timings of the backends and converters, written as JSON.
+
+The wine fixtures are used as they are, and copied with renamed URIs and
+blank nodes into synthetic datasets of a given number of triples. Every
+backend that can be connected to is measured: rdflib always, redland if
+librdf is installed, sesame and allegro if a server is running (see
+their tests for the environment variables).
+
+With --baseline, the timings are compared to an earlier output and the
+script exits with status 1 if any of them got slower by more than the
+tolerance.
+
+Usage::
+
+  > python benchmarks/bench_suite.py [--triples 10000,1000000]
+        [--backends rdflib] [--repeat 3] [--output results.json]
+        [--baseline baseline.json] [--tolerance 0.25]
+"""
+import argparse
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import simplejson
+
+import sparrow
+from sparrow import utils
+from sparrow.error import ConnectionError
+
+from bench_sparql_results import make_results
+
+TESTS = os.path.join(os.path.dirname(__file__), os.pardir,
+                     'src', 'sparrow', 'tests')
+
+FORMATS = ('ntriples', 'turtle', 'rdfxml', 'json')
+
+SELECT = """
+prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+select ?s ?label where { ?s rdfs:label ?label }
+"""
+
+CONSTRUCT = """
+prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+construct { ?s rdfs:label ?label } where { ?s rdfs:label ?label }
+"""
+
+ASK = """
+prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+ask { ?s rdfs:label "no such label" }
+"""
+
+
+def backend_uris():
+    env = os.environ.get
+    return [
+        ('rdflib', 'memory'),
+        ('redland', 'memory'),
+        ('sesame', 'http://%s:%s/test' % (env('SESAME_HOST', 'localhost'),
+                                          env('SESAME_PORT', '8000'))),
+        ('allegro', 'http://%s:%s/test' % (env('ALLEGRO_HOST', 'localhost'),
+                                           env('ALLEGRO_PORT', '10035'))),
+    ]
+
+
+def connect(name, uri):
+    try:
+        return sparrow.database(name, uri)
+    except (ConnectionError, ImportError, NameError) as err:
+        print('skipping %s: %s' % (name, err), file=sys.stderr)
+        return None
+
+
+def make_dataset(triples, path, bnodes=True):
+    """Writes the wine triples, copied until there are ``triples`` lines.
+
+    Every copy gets its own URIs and blank nodes, so the statements do
+    not collapse in the store. With bnodes false, the triples with blank
+    nodes are left out.
+    """
+    with open(os.path.join(TESTS, 'wine.nt'), 'rb') as f:
+        lines = [line for line in f.read().splitlines(True)
+                 if line.strip() and (bnodes or b'_:' not in line)]
+    written = copy = 0
+    with open(path, 'wb') as out:
+        while written < triples:
+            data = b''.join(lines[:triples - written])
+            if copy:
+                data = data.replace(b'wine#', b'wine-%d#' % copy)
+                data = re.sub(rb'_:(\w+)', rb'_:c%d\1' % copy, data)
+            out.write(data)
+            written += min(len(lines), triples - written)
+            copy += 1
+    return written
+
+
+def best(function, repeat, setup=None):
+    """Returns the shortest time of function, and its last result"""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def read(file):
+    data = file.read()
+    if hasattr(file, 'close'):
+        file.close()
+    return data
+
+
+class Suite(object):
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = {}
+
+    def time(self, key, function, count, setup=None):
+        """Times function, which handles count triples or result rows"""
+        seconds, result = best(function, self.repeat, setup)
+        rate = count / seconds if seconds else None
+        self.results[key] = {'seconds': seconds, 'count': count,
+                             'rate': rate}
+        print('%-44s %9.4f s %12.0f /s' % (key, seconds, rate or 0))
+        return result
+
+    def backend(self, name, db, label, path, triples):
+        prefix = '%s/%s/' % (name, label)
+
+        def clear():
+            db.clear('bench')
+
+        def load():
+            clear()
+            with open(path, 'rb') as f:
+                db.add_ntriples(f, 'bench')
+
+        self.time(prefix + 'add_ntriples', load, triples)
+        outputs = {}
+        for format in FORMATS:
+            method = getattr(db, 'get_' + format)
+            outputs[format] = self.time(prefix + 'get_' + format,
+                                        lambda: read(method('bench')),
+                                        triples)
+        data = self.time(prefix + 'get_dict',
+                         lambda: db.get_dict('bench'), triples)
+        self.time(prefix + 'get_columns',
+                  lambda: db.get_columns('bench'), triples)
+        self.time(prefix + 'get_nquads', lambda: read(db.get_nquads()),
+                  triples)
+
+        rows = len(db.select(SELECT))
+        self.time(prefix + 'select', lambda: db.select(SELECT), rows)
+        self.time(prefix + 'construct',
+                  lambda: read(db.construct(CONSTRUCT, 'ntriples')), rows)
+        self.time(prefix + 'ask', lambda: db.ask(ASK), 1)
+
+        for format in FORMATS[1:]:
+            method = getattr(db, 'add_' + format)
+            if format == 'rdfxml':
+                add = lambda: method(BytesIO(to_bytes(outputs[format])),
+                                     'bench', None)
+            else:
+                add = lambda: method(BytesIO(to_bytes(outputs[format])),
+                                     'bench')
+            self.time(prefix + 'add_' + format, add, triples, setup=clear)
+        self.time(prefix + 'add_dict', lambda: db.add_dict(data, 'bench'),
+                  triples, setup=clear)
+        clear()
+
+    def converters(self, label, path, triples):
+        prefix = 'utils/%s/' % label
+        with open(path, 'rb') as f:
+            nt = f.read()
+        data = self.time(prefix + 'ntriples_to_dict',
+                         lambda: utils.ntriples_to_dict(BytesIO(nt)), triples)
+        self.time(prefix + 'dict_to_ntriples',
+                  lambda: read(utils.dict_to_ntriples(data)), triples)
+        json = self.time(prefix + 'ntriples_to_json',
+                         lambda: read(utils.ntriples_to_json(BytesIO(nt))),
+                         triples)
+        self.time(prefix + 'json_to_ntriples',
+                  lambda: read(utils.json_to_ntriples(
+                      BytesIO(to_bytes(json)))), triples)
+        nquads = self.time(prefix + 'ntriples_to_nquads',
+                           lambda: ''.join(utils.ntriples_to_nquads(
+                               BytesIO(nt), 'bench')), triples)
+        self.time(prefix + 'nquads_to_ntriples',
+                  lambda: utils.nquads_to_ntriples(BytesIO(to_bytes(nquads))),
+                  triples)
+
+    def sparql_results(self, rows):
+        for mimetype, data in make_results(rows).items():
+            parse = utils.SPARQL_RESULT_PARSERS[mimetype]
+            self.time('utils/%d/%s' % (rows, mimetype),
+                      lambda: sum(1 for row in parse(BytesIO(data))), rows)
+
+
+def to_bytes(data):
+    return data.encode('utf-8') if isinstance(data, str) else data
+
+
+def compare(results, baseline, tolerance):
+    """Prints the changes against the baseline, returns the regressions"""
+    regressions = []
+    for key, result in sorted(results.items()):
+        if key not in baseline:
+            continue
+        before, after = baseline[key]['seconds'], result['seconds']
+        ratio = after / before if before else 1.0
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print('%-44s %9.4f s -> %9.4f s %+7.1f%%%s' % (
+            key, before, after, (ratio - 1) * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--triples', default='10000',
+                        help='comma separated dataset sizes')
+    parser.add_argument('--backends', default=None,
+                        help='comma separated backends, all by default')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.triples.split(',')]
+    backends = [(name, uri) for name, uri in backend_uris()
+                if args.backends is None or name in args.backends.split(',')]
+    suite = Suite(args.repeat)
+    workdir = tempfile.mkdtemp()
+    try:
+        datasets = [('wine', os.path.join(TESTS, 'wine.nt'), None)]
+        for size in sizes:
+            path = os.path.join(workdir, '%d.nt' % size)
+            datasets.append((str(size), path, make_dataset(size, path)))
+        with open(datasets[0][1], 'rb') as f:
+            wine = sum(1 for line in f if line.strip())
+        datasets[0] = 'wine', datasets[0][1], wine
+
+        for label, path, triples in datasets:
+            suite.converters(label, path, triples)
+        suite.sparql_results(max(sizes))
+        for name, uri in backends:
+            db = connect(name, uri)
+            if db is None:
+                continue
+            try:
+                for label, path, triples in datasets:
+                    suite.backend(name, db, label, path, triples)
+            finally:
+                db.disconnect()
+    finally:
+        shutil.rmtree(workdir)
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'repeat': args.repeat,
+              'results': suite.results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            simplejson.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = simplejson.load(f)['results']
+        regressions = compare(suite.results, baseline, args.tolerance)
+        if regressions:
+            print('%d regressions over %d%%' % (len(regressions),
+                                                args.tolerance * 100))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
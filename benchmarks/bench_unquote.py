@@ -0,0 +1,31 @@
+"""Throughput of N-Triples literal unescaping on multi-MB literals.
+
+Usage::
+
+  > python benchmarks/bench_unquote.py [megabytes]
+"""
+import sys
+import timeit
+
+from sparrow import ntriples
+
+
+def make_literal(size):
+    # mixes plain text with the escapes found in abstracts and embedded json
+    chunk = 'Lorem ipsum {\\"key\\": \\"caf\\u00E9\\"}\\n\\tdolor sit amet, '
+    return chunk * (size // len(chunk) + 1)
+
+
+def main(megabytes=4):
+    literal = make_literal(megabytes * 1024 * 1024)
+    for validate in (False, True):
+        ntriples.validate = validate
+        seconds = min(timeit.repeat(lambda: ntriples.unquote(literal),
+                                    number=1, repeat=3))
+        print('unquote validate=%-5s %6.1f MB/s' % (
+            validate, len(literal) / seconds / 1024 / 1024))
+    ntriples.validate = False
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -1,19 +1,69 @@
-from sparrow.redland_backend import RedlandTripleStore
-from sparrow.rdflib_backend import RDFLibTripleStore
-from sparrow.sesame_backend import SesameTripleStore
-from sparrow.allegro_backend import AllegroTripleStore
+from importlib import import_module
+
+# Backends are imported on first use, so that importing sparrow does not
+# pull in the libraries of every backend. Third party backends can be
+# registered with register_backend, or with an entry point in the
+# 'sparrow.backends' group.
+ENTRY_POINT_GROUP = 'sparrow.backends'
+
+_backends = {
+    'redland': 'sparrow.redland_backend:RedlandTripleStore',
+    'rdflib': 'sparrow.rdflib_backend:RDFLibTripleStore',
+    'sesame': 'sparrow.sesame_backend:SesameTripleStore',
+    'allegro': 'sparrow.allegro_backend:AllegroTripleStore',
+}
+
+
+def register_backend(name, factory):
+    """Register a backend factory, a class or a 'module:name' string"""
+    _backends[name] = factory
+
+
+def _entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python < 3.8
+        from pkg_resources import iter_entry_points
+        return list(iter_entry_points(ENTRY_POINT_GROUP))
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=ENTRY_POINT_GROUP))
+    return list(eps.get(ENTRY_POINT_GROUP, []))
+
+
+def get_backend(name):
+    """Returns the factory of a backend, importing it if needed"""
+    if name not in _backends:
+        for entry_point in _entry_points():
+            if entry_point.name == name:
+                _backends[name] = entry_point.load()
+                break
+        else:
+            raise ValueError('Unknown database backend: "%s"' % name)
+
+    factory = _backends[name]
+    if isinstance(factory, str):
+        module, attr = factory.split(':')
+        factory = _backends[name] = getattr(import_module(module), attr)
+    return factory
+
 
 def database(backend, dburi):
-    if backend == 'redland':
-        db = RedlandTripleStore()
-    elif backend == 'rdflib':
-        db = RDFLibTripleStore()
-    elif backend == 'sesame':
-        db = SesameTripleStore()
-    elif backend == 'allegro':
-        db = AllegroTripleStore()
-    else:
-        raise ValueError('Unknown database backend: "%s"' % backend)
+    db = get_backend(backend)()
     db.connect(dburi)
     return db
 
+
+_exports = {
+    'RedlandTripleStore': 'redland',
+    'RDFLibTripleStore': 'rdflib',
+    'SesameTripleStore': 'sesame',
+    'AllegroTripleStore': 'allegro',
+}
+
+
+def __getattr__(name):
+    # keeps `from sparrow import RDFLibTripleStore` working
+    if name in _exports:
+        return get_backend(_exports[name])
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
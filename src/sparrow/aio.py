@@ -0,0 +1,121 @@
+"""Asyncio access to a backend.
+
+The backends are synchronous: Sesame makes blocking HTTP requests and the
+in-process stores use the CPU. AsyncTripleStore runs their calls on a
+bounded thread pool, so they don't block the event loop. Up to the
+backend's ``max_concurrency`` calls run at the same time, which lets the
+Sesame backend have many requests in flight, one session per thread.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+# methods that are run as they are
+METHODS = (
+    'contexts', 'clear', 'count', 'register_prefix',
+    'add_rdfxml', 'add_ntriples', 'add_turtle', 'add_json', 'add_dict',
+    'add_nquads', 'bulk_load',
+    'remove_rdfxml', 'remove_ntriples', 'remove_turtle', 'remove_json',
+    'remove_dict',
+    'get_dict', 'get_columns',
+    'select', 'select_columns', 'ask')
+
+# methods that return a file object, returned as an AsyncStream
+FILE_METHODS = (
+    'get_rdfxml', 'get_ntriples', 'get_turtle', 'get_json', 'get_nquads',
+    'construct')
+
+
+class AsyncTripleStore(object):
+    """Async versions of the methods of a connected backend.
+
+    The get methods, and construct, return an AsyncStream over the result,
+    which is read in the thread pool as it is awaited.
+    """
+
+    def __init__(self, db, max_workers=None):
+        self.db = db
+        self._executor = ThreadPoolExecutor(
+            max_workers or getattr(db, 'max_concurrency', 1))
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(func, *args, **kwargs))
+
+    async def iter_select(self, sparql, terms=None, batch_size=1000):
+        """Async iterator over the bindings, read in batches"""
+        results = await self._run(self.db.iter_select, sparql, terms)
+        while True:
+            batch = await self._run(list, islice(results, batch_size))
+            if not batch:
+                break
+            for binding in batch:
+                yield binding
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class AsyncStream(object):
+    """A file object of a backend, read in the thread pool.
+
+    ``await stream.read(size)`` reads like the file does, ``async for``
+    yields blocks of up to ``chunk_size``, so a large result is never
+    held in memory at once.
+    """
+
+    def __init__(self, store, file, chunk_size=64 * 1024):
+        self._store = store
+        self._file = file
+        self.chunk_size = chunk_size
+
+    async def read(self, size=-1):
+        return await self._store._run(self._file.read, size)
+
+    async def __aiter__(self):
+        while True:
+            chunk = await self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    async def close(self):
+        await self._store._run(self._file.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+def _method(name):
+    async def method(self, *args, **kwargs):
+        return await self._run(getattr(self.db, name), *args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+def _file_method(name):
+    async def method(self, *args, **kwargs):
+        result = await self._run(getattr(self.db, name), *args, **kwargs)
+        if result is None or not hasattr(result, 'read'):
+            # construct returns dicts for the dict format
+            return result
+        return AsyncStream(self, result)
+    method.__name__ = name
+    return method
+
+
+for _name in METHODS:
+    setattr(AsyncTripleStore, _name, _method(_name))
+for _name in FILE_METHODS:
+    setattr(AsyncTripleStore, _name, _file_method(_name))
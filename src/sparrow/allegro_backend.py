@@ -7,10 +7,12 @@ from zope.interface import implementer
 
 from sparrow.error import ConnectionError, TripleStoreError, QueryError
 from sparrow.interfaces import ITripleStore, ISPARQLEndpoint
-from sparrow.utils import (parse_sparql_result,
+from sparrow.utils import (compress,
+                           parse_sparql_result,
                            ntriples_to_json,
                            ntriples_to_dict)
 
+from sparrow.base_backend import modifies
 from sparrow.sesame_backend import SesameTripleStore
 
 @implementer(ITripleStore, ISPARQLEndpoint)
@@ -82,19 +84,21 @@ class AllegroTripleStore(SesameTripleStore):
             serializer.set_namespace(prefix, ns)
         return StringIO(serializer.serialize_model_to_string(model))
 
+    @modifies
     def add_turtle(self, data, context):
         data = self._get_file(data)
         data = self._turtle_to_ntriples(data)
         self.add_ntriples(data, context)
         
+    @modifies
     def remove_turtle(self, data, context):
         data = self._get_file(data)
         data = self._turtle_to_ntriples(data)
         self.remove_ntriples(data, context)
 
-    def get_turtle(self, context):
+    def get_turtle(self, context, compression=None):
         data = self.get_ntriples(context)
-        return self._ntriples_to_turtle(data)
+        return compress(self._ntriples_to_turtle(data), compression)
 
     def construct(self, query, fmt):
         result =  super(AllegroTripleStore, self).construct(query, 'rdfxml')
@@ -1,69 +1,221 @@
 import codecs
 from abc import ABC
-from io import BytesIO, StringIO
-
-from six.moves import urllib_request as urllib2
-
-from sparrow.error import TripleStoreError
-from sparrow.utils import (json_to_ntriples,
+from functools import wraps
+from io import BufferedReader, BytesIO, TextIOWrapper
+from typing import NamedTuple
+
+from sparrow import instrument
+from sparrow.bulk import bulk_load
+from sparrow.error import QueryError, TripleStoreError
+from sparrow.instrument import instrument_class
+from sparrow.interfaces import ISPARQLEndpoint, ITripleStore
+from sparrow.ntriples import ParseError, iter_triples
+from sparrow.utils import (Columns,
+                           bind_values,
+                           compress,
+                           is_uri,
+                           open_source,
+                           json_to_ntriples,
                            dict_to_ntriples,
                            ntriples_to_json,
-                           ntriples_to_dict)
+                           ntriples_to_dict,
+                           iter_graphs,
+                           IterStream,
+                           ntriples_to_nquads)
+
+
+class BoundQuery(NamedTuple):
+    """A prepared query with the value dicts of some of its variables"""
+    query: object
+    bindings: dict
+
+
+class PreparedQuery(object):
+    """A SPARQL query that is prepared once and run with bindings, as
+    returned by ISPARQLEndpoint.prepare
+
+    The bindings map variable names, without the '?', to value dicts as
+    in select results. A prepared query can be shared by threads.
+    """
+
+    def __init__(self, db, sparql):
+        self.db = db
+        self.sparql = sparql
+        self._query = db._prepare(sparql)
+
+    def _bind(self, bindings):
+        return self.db._bind(self._query, bindings or {})
+
+    def select(self, bindings=None, terms=None):
+        return self.db.select(self._bind(bindings), terms)
+
+    def iter_select(self, bindings=None, terms=None):
+        return self.db.iter_select(self._bind(bindings), terms)
+
+    def select_columns(self, bindings=None, terms=None):
+        return self.db.select_columns(self._bind(bindings), terms)
+
+    def ask(self, bindings=None):
+        return self.db.ask(self._bind(bindings))
+
+    def construct(self, format, bindings=None):
+        return self.db.construct(self._bind(bindings), format)
+
+
+def modifies(method):
+    """Marks a method that changes the store, it bumps the generation"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.generation += 1
+    return wrapper
+
+
+# the methods that report their calls to the sparrow.instrument listeners
+OPERATIONS = tuple(ITripleStore.names()) + tuple(ISPARQLEndpoint.names())
 
 
 class BaseBackend(ABC):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        instrument_class(cls, OPERATIONS)
+
+    # counts the changes to the store, see sparrow.cache
+    generation = 0
+
+    # number of calls AsyncTripleStore runs at the same time, in process
+    # stores are not safe to use from several threads
+    max_concurrency = 1
 
     def _is_uri(self, data):
-        if not isinstance(data, str):
-            return False
-        return data.startswith('http://') or data.startswith('file://')
+        return is_uri(data)
 
     def _get_file(self, data):
-        if self._is_uri(data):
-            if data.startswith('file://'):
-                return open(data[7:], 'rb')
-            elif data.startswith('http://'):
-                return urllib2.urlopen(data)
-        elif all(hasattr(data, a) for a in ('read', 'seek', 'close')):
-            return data
-        else:
-            return BytesIO(bytes(data, encoding='utf-8'))
+        return open_source(data)
+
+    def bulk_load(self, sources, workers=None, batch_size=100000,
+                  progress=None):
+        return bulk_load(self, sources, workers, batch_size, progress)
 
+    @modifies
     def add_json(self, data, context_name):
         data = self._get_file(data)
         try:
             data = json_to_ntriples(data)
+            self.add_ntriples(data, context_name)
         except ValueError as err:
             raise TripleStoreError(err)
 
-        self.add_ntriples(data, context_name)
-
+    @modifies
     def add_dict(self, data, context_name):
         data = dict_to_ntriples(data)
         self.add_ntriples(data, context_name)
 
-    def get_json(self, context_name):
+    def get_json(self, context_name, indent=True, compression=None):
+        data = self.get_ntriples(context_name)
+        return compress(ntriples_to_json(data, indent=indent), compression)
+
+    def get_dict(self, context_name, parallel=None, terms=None):
         data = self.get_ntriples(context_name)
-        return ntriples_to_json(data)
+        return ntriples_to_dict(data, parallel=parallel, terms=terms)
 
-    def get_dict(self, context_name):
+    def get_columns(self, context_name, terms=None):
+        columns = Columns(('subject', 'predicate', 'object'), terms)
         data = self.get_ntriples(context_name)
-        return ntriples_to_dict(data)
+        for triple in iter_triples(data):
+            columns.append_terms(triple)
+        instrument.record(triples=len(columns))
+        return columns
 
+    @modifies
     def remove_json(self, data, context_name):
         data = self._get_file(data)
-        data = json_to_ntriples(data)
-        self.remove_ntriples(data, context_name)
+        try:
+            data = json_to_ntriples(data)
+            self.remove_ntriples(data, context_name)
+        except ValueError as err:
+            raise TripleStoreError(err)
 
+    @modifies
     def remove_dict(self, data, context_name):
         data = dict_to_ntriples(data)
         self.remove_ntriples(data, context_name)
 
+    @modifies
+    def add_nquads(self, data):
+        # every run of statements in one graph is added while it is read
+        data = self._get_file(data)
+        try:
+            for context_name, triples in iter_graphs(data):
+                if context_name is None:
+                    raise TripleStoreError(
+                        'N-Quads statements without a graph are not supported')
+                self.add_ntriples(triples, context_name)
+        except ParseError as err:
+            raise TripleStoreError(err)
+
+    def get_nquads(self, compression=None):
+        result = IterStream(self._iter_nquads())
+        if compression is not None:
+            return compress(result, compression)
+        return TextIOWrapper(BufferedReader(result), encoding='utf-8')
+
+    def _iter_nquads(self, batch_size=1000):
+        # the contexts are serialized one at a time, as the result is read
+        for context_name in self.contexts():
+            data = self.get_ntriples(context_name)
+            lines = []
+            for line in ntriples_to_nquads(data, context_name):
+                lines.append(line)
+                if len(lines) >= batch_size:
+                    yield ''.join(lines).encode('utf-8')
+                    lines = []
+            if lines:
+                yield ''.join(lines).encode('utf-8')
+
+    def prepare(self, sparql):
+        return PreparedQuery(self, sparql)
+
+    def _prepare(self, sparql):
+        # backends that can parse a query ahead return the parsed query
+        return sparql
+
+    def _bind(self, query, bindings):
+        try:
+            return bind_values(query, bindings)
+        except ValueError as err:
+            raise QueryError(err)
+
+    def iter_select(self, sparql, terms=None):
+        result = self.select(sparql, terms)
+        if isinstance(result, bool):
+            # the result of an ASK query
+            return iter([result])
+        return iter(result)
+
+    def select_columns(self, sparql, terms=None):
+        columns = Columns(terms=terms)
+        for binding in self.iter_select(sparql):
+            if isinstance(binding, bool):
+                raise QueryError(
+                    'select_columns needs a SELECT query, use ask for ASK '
+                    'queries')
+            columns.append(binding)
+        instrument.record(rows=len(columns))
+        return columns
+
+    @modifies
     def add_ntriples(self, data, context_name):
         pass
 
+    @modifies
     def remove_ntriples(self, data, context_name):
         pass
 
     def get_ntriples(self, context_name):
         pass
+
+
+instrument_class(BaseBackend, OPERATIONS)
@@ -0,0 +1,168 @@
+"""Bulk loading of many sources into a backend.
+
+Every source is converted to N-Triples in a temporary file, optionally on
+a process pool. The files are then sent to the backend in batches per
+context, so loading hundreds of small files takes a few add_ntriples
+calls instead of hundreds.
+"""
+import glob
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+from typing import NamedTuple
+from uuid import uuid4
+
+from sparrow import instrument, ntriples
+from sparrow.error import TripleStoreError
+from sparrow.utils import IterStream, json_to_ntriples, open_source
+
+FORMATS = ('ntriples', 'turtle', 'rdfxml', 'json')
+
+# rdflib parser names of the formats that are parsed with rdflib
+RDFLIB_FORMATS = {'turtle': 'turtle', 'rdfxml': 'xml'}
+
+
+class LoadProgress(NamedTuple):
+    sources: int
+    statements: int
+    seconds: float
+
+    @property
+    def rate(self):
+        """Statements per second"""
+        return self.statements / self.seconds if self.seconds else 0.0
+
+
+def expand_sources(sources):
+    """Yields (data, format, context) items, with file:// globs expanded"""
+    for data, format, context in sources:
+        if format not in FORMATS:
+            raise ValueError('Unsupported format: %s' % format)
+        if (isinstance(data, str) and data.startswith('file://') and
+                glob.has_magic(data)):
+            for path in sorted(glob.glob(data[7:])):
+                yield 'file://' + path, format, context
+        else:
+            yield data, format, context
+
+
+@instrument.instrumented('bulk.convert_source')
+def convert_source(data, format, bnode_prefix):
+    """Writes a source as N-Triples to a temporary file.
+
+    Blank node labels get ``bnode_prefix``, so they do not clash with the
+    labels of the other sources in a batch. Returns the path of the file
+    and the number of statements.
+    """
+    file = source = open_source(data)
+    fd, path = tempfile.mkstemp(suffix='.nt')
+    try:
+        with open(fd, 'w', encoding='utf-8') as out:
+            if format == 'json':
+                source = json_to_ntriples(file)
+            elif format in RDFLIB_FORMATS:
+                source = _rdflib_to_ntriples(file, RDFLIB_FORMATS[format])
+            parser = ntriples.NTriplesParser(bnode_prefix=bnode_prefix)
+            serialize = ntriples.serialize
+            count = 0
+            for s, p, o in parser.iter_triples(source):
+                out.write('%s %s %s .\n' % (serialize(s), serialize(p),
+                                            serialize(o)))
+                count += 1
+        instrument.record(triples=count)
+        return path, count
+    except BaseException as err:
+        os.unlink(path)
+        if isinstance(err, (ntriples.ParseError, ValueError)):
+            raise TripleStoreError('%s: %s' % (data, err))
+        raise
+    finally:
+        if isinstance(data, str):
+            file.close()
+
+
+def _rdflib_to_ntriples(file, format):
+    import rdflib
+    graph = rdflib.Graph()
+    try:
+        graph.parse(file, format=format)
+    except Exception as err:
+        # the rdflib parsers raise all kinds of errors
+        raise ValueError(err)
+    data = graph.serialize(format='nt')
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return StringIO(data)
+
+
+def _read_files(paths):
+    for path in paths:
+        with open(path, 'rb') as f:
+            yield from iter(lambda: f.read(ntriples.bufsiz), b'')
+
+
+def bulk_load(db, sources, workers=None, batch_size=100000, progress=None):
+    """Add many (data, format, context) sources to db, see ITripleStore"""
+    start = time.perf_counter()
+    prefix = 'b%s' % uuid4().hex[:12]
+    items = list(expand_sources(sources))
+    pending = {}  # context -> ([paths], statements)
+    loaded = statements = 0
+
+    def report():
+        if progress is not None:
+            progress(LoadProgress(loaded, statements,
+                                  time.perf_counter() - start))
+
+    def flush(context):
+        nonlocal statements
+        paths, count = pending.pop(context)
+        try:
+            db.add_ntriples(IterStream(_read_files(paths)), context)
+        finally:
+            for path in paths:
+                os.unlink(path)
+        statements += count
+        report()
+
+    pool = ProcessPoolExecutor(workers) if workers else None
+    futures = {}
+    try:
+        # file objects can't be sent to a worker, they are converted here
+        if pool is not None:
+            for i, (data, format, context) in enumerate(items):
+                if isinstance(data, str):
+                    futures[i] = pool.submit(convert_source, data, format,
+                                             '%s_%d_' % (prefix, i))
+        for i, (data, format, context) in enumerate(items):
+            if i in futures:
+                path, count = futures.pop(i).result()
+            else:
+                path, count = convert_source(data, format,
+                                             '%s_%d_' % (prefix, i))
+            paths, total = pending.get(context, ([], 0))
+            paths.append(path)
+            pending[context] = paths, total + count
+            loaded += 1
+            # sources are never split over batches, a blank node label
+            # only denotes the same node within one request
+            if total + count >= batch_size:
+                flush(context)
+        for context in list(pending):
+            flush(context)
+    finally:
+        if pool is not None:
+            # shutdown(cancel_futures=True) needs Python 3.9
+            for future in futures.values():
+                future.cancel()
+            pool.shutdown(wait=True)
+        # the files of a failed load
+        for future in futures.values():
+            if not future.cancelled() and future.exception() is None:
+                os.unlink(future.result()[0])
+        for paths, count in pending.values():
+            for path in paths:
+                os.unlink(path)
+    return LoadProgress(loaded, statements, time.perf_counter() - start)
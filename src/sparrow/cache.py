@@ -0,0 +1,169 @@
+"""A cache of SPARQL query results.
+
+CachedEndpoint wraps a backend and keeps the results of select, ask and
+construct queries in a QueryCache. The key of a result includes the
+generation of the store, which every add_*, remove_* and clear call
+bumps, and a token of the CachedEndpoint, so endpoints that share a
+QueryCache do not see each other's results. A write makes all earlier
+results unreachable; they are then evicted as the least recently used.
+
+The cache is opt-in::
+
+  >>> db = CachedEndpoint(sparrow.database('rdflib', 'memory'))
+
+Every caller gets a copy of a cached result, which it may modify.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from io import BytesIO, StringIO
+from typing import NamedTuple
+
+from zope.interface import implementer
+
+from sparrow.interfaces import ISPARQLEndpoint
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def sizeof(value):
+    """Returns an estimate of the memory used by a query result"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sizeof(key) + sizeof(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += sizeof(item)
+    return size
+
+
+class QueryCache(object):
+    """A least recently used cache bounded in bytes.
+
+    Entries older than ``ttl`` seconds are not returned, None keeps them
+    until they are evicted. Values larger than ``max_bytes`` are not
+    cached.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, time)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the value of key, or None if it is not cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and (
+                    time.monotonic() - entry[2] > self.ttl):
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        if size is None:
+            size = sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = value, size, time.monotonic()
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, key):
+        value, size, added = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions,
+                              len(self._entries), self._bytes)
+
+
+@implementer(ISPARQLEndpoint)
+class CachedEndpoint(object):
+    """A backend with cached query results.
+
+    Everything but select, ask and construct is passed on to ``db``.
+    Queries with a ``terms`` argument are not cached, their results refer
+    to the ids of the given TermDict.
+    """
+
+    def __init__(self, db, cache=None, max_bytes=64 * 1024 * 1024, ttl=None):
+        self.db = db
+        self.cache = QueryCache(max_bytes, ttl) if cache is None else cache
+        # ids can be reused, this token lives as long as the entries
+        self._token = object()
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def stats(self):
+        return self.cache.stats()
+
+    def _cached(self, key, run):
+        # the generation is read before the query, a write during the
+        # query stores the result under the key that is already stale
+        key = (self._token,) + key + (self.db.generation,)
+        value = self.cache.get(key)
+        if value is None:
+            value = run()
+            self.cache.put(key, value)
+        return value
+
+    def select(self, sparql, terms=None):
+        if terms is not None:
+            return self.db.select(sparql, terms)
+        return deepcopy(self._cached(('select', sparql),
+                                     lambda: self.db.select(sparql)))
+
+    def ask(self, sparql):
+        return self._cached(('ask', sparql), lambda: self.db.ask(sparql))
+
+    def construct(self, sparql, format):
+        def run():
+            result = self.db.construct(sparql, format)
+            if hasattr(result, 'read'):
+                return result.read()
+            return result
+
+        value = self._cached(('construct', sparql, format), run)
+        if isinstance(value, str):
+            return StringIO(value)
+        elif isinstance(value, bytes):
+            return BytesIO(value)
+        return deepcopy(value)
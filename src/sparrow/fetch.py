@@ -0,0 +1,111 @@
+"""Fetching of remote sources given to the add_* and remove_* methods.
+
+Requests share a session, so connections are kept alive and reused, and
+gzip or deflate encoded responses are decoded while they are read. When
+``cache_dir`` is set, responses are stored there and fetched again with
+a conditional GET, so an unchanged source costs a 304 response.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+import requests
+import simplejson
+
+from sparrow.error import ConnectionError
+
+# directory of the response cache, None to not cache responses
+cache_dir = None
+timeout = 60
+
+_session = None
+
+
+def get_session():
+    """Returns the session shared by all fetches"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
+
+
+def fetch(url, cache_path=None):
+    """Returns a binary file-like object with the content of url.
+
+    ``cache_path`` defaults to the module's ``cache_dir``.
+    """
+    cache = HTTPCache(cache_path or cache_dir)
+    headers = cache.validators(url) if cache.path else {}
+    try:
+        resp = get_session().get(url, headers=headers, stream=True,
+                                 timeout=timeout)
+    except requests.RequestException as err:
+        raise ConnectionError('Can not fetch %s: %s' % (url, err))
+
+    if resp.status_code == 304 and headers:
+        resp.close()
+        return cache.open(url)
+    if resp.status_code != 200:
+        resp.close()
+        raise ConnectionError('Can not fetch %s: %d' % (url, resp.status_code))
+
+    # decode gzipped responses while reading
+    resp.raw.decode_content = True
+    if cache.path and ('ETag' in resp.headers or
+                       'Last-Modified' in resp.headers):
+        try:
+            cache.store(url, resp)
+        finally:
+            resp.close()
+        return cache.open(url)
+    return resp.raw
+
+
+class HTTPCache(object):
+    """Responses stored in a directory with their validators"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _filename(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, key)
+
+    def validators(self, url):
+        """Returns the headers of a conditional GET of url, if cached"""
+        try:
+            with open(self._filename(url) + '.json') as f:
+                meta = simplejson.load(f)
+        except (IOError, ValueError):
+            return {}
+        if not os.path.exists(self._filename(url)):
+            return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def open(self, url):
+        return open(self._filename(url), 'rb')
+
+    def store(self, url, resp):
+        os.makedirs(self.path, exist_ok=True)
+        filename = self._filename(url)
+        # written next to the cache entry and renamed, so readers never
+        # see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(resp.raw, f, 1024 * 1024)
+            os.replace(tmp, filename)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with open(filename + '.json', 'w') as f:
+            simplejson.dump({'url': url,
+                             'etag': resp.headers.get('ETag'),
+                             'last_modified': resp.headers.get('Last-Modified')},
+                            f)
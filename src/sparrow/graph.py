@@ -0,0 +1,139 @@
+"""An indexed in-memory view of triples in the dict format.
+
+The dict format, as returned by get_dict, maps subjects to predicates to
+lists of value dicts, so it can only be looked up by subject. DictGraph
+adds indexes by predicate and by object, which are built when they are
+first needed and kept up to date by add and remove.
+"""
+from sparrow.utils import ntriples_to_dict
+
+
+def value_key(value):
+    """Returns a hashable key of a value dict"""
+    return (value['value'], value['type'],
+            value.get('lang'), value.get('datatype'))
+
+
+class DictGraph(object):
+    """Triples in the dict format, with lookup by triple pattern.
+
+    ``data`` is used, and modified, in place. Values are dicts as in the
+    dict format, None in a pattern matches anything.
+    """
+
+    def __init__(self, data=None):
+        self.data = {} if data is None else data
+        # predicate -> subjects, object key -> (subject, predicate) pairs
+        self._predicates = None
+        self._objects = None
+
+    @classmethod
+    def from_ntriples(cls, file, terms=None):
+        return cls(ntriples_to_dict(file, terms=terms))
+
+    def _predicate_index(self):
+        if self._predicates is None:
+            index = {}
+            for subject, predicates in self.data.items():
+                for predicate in predicates:
+                    index.setdefault(predicate, set()).add(subject)
+            self._predicates = index
+        return self._predicates
+
+    def _object_index(self):
+        if self._objects is None:
+            index = {}
+            for subject, predicates in self.data.items():
+                for predicate, values in predicates.items():
+                    for value in values:
+                        index.setdefault(value_key(value), set()).add(
+                            (subject, predicate))
+            self._objects = index
+        return self._objects
+
+    def __len__(self):
+        return sum(len(values) for predicates in self.data.values()
+                   for values in predicates.values())
+
+    def __contains__(self, triple):
+        for match in self.triples(*triple):
+            return True
+        return False
+
+    def triples(self, subject=None, predicate=None, value=None):
+        """Yields the (subject, predicate, value) triples of a pattern"""
+        key = None if value is None else value_key(value)
+        if subject is not None:
+            pairs = [(subject, predicate)]
+        elif key is not None:
+            pairs = self._object_index().get(key, ())
+            if predicate is not None:
+                pairs = [(s, p) for s, p in pairs if p == predicate]
+        elif predicate is not None:
+            pairs = [(s, predicate)
+                     for s in self._predicate_index().get(predicate, ())]
+        else:
+            pairs = [(s, None) for s in self.data]
+
+        for s, p in pairs:
+            predicates = self.data.get(s)
+            if not predicates:
+                continue
+            if p is None:
+                items = predicates.items()
+            elif p in predicates:
+                items = [(p, predicates[p])]
+            else:
+                continue
+            for p, values in items:
+                for v in values:
+                    if key is None or value_key(v) == key:
+                        yield s, p, v
+
+    def subjects(self, predicate=None, value=None):
+        """Returns the set of subjects of the triples of a pattern"""
+        if predicate is None and value is None:
+            return set(self.data)
+        return {s for s, p, v in self.triples(None, predicate, value)}
+
+    def values(self, subject, predicate):
+        """Returns the values of a subject and predicate"""
+        return list(self.data.get(subject, {}).get(predicate, ()))
+
+    def add(self, subject, predicate, value):
+        """Add a triple, unless it is already there"""
+        values = self.data.setdefault(subject, {}).setdefault(predicate, [])
+        key = value_key(value)
+        if any(value_key(v) == key for v in values):
+            return
+        values.append(value)
+        if self._predicates is not None:
+            self._predicates.setdefault(predicate, set()).add(subject)
+        if self._objects is not None:
+            self._objects.setdefault(key, set()).add((subject, predicate))
+
+    def remove(self, subject=None, predicate=None, value=None):
+        """Remove the triples of a pattern"""
+        for s, p, v in list(self.triples(subject, predicate, value)):
+            predicates = self.data.get(s)
+            if not predicates or p not in predicates:
+                # removed with an equal value before
+                continue
+            key = value_key(v)
+            predicates[p] = values = [x for x in predicates[p]
+                                      if value_key(x) != key]
+            if self._objects is not None:
+                pairs = self._objects.get(key)
+                if pairs is not None:
+                    pairs.discard((s, p))
+                    if not pairs:
+                        del self._objects[key]
+            if values:
+                continue
+            del predicates[p]
+            if self._predicates is not None:
+                self._predicates[p].discard(s)
+                if not self._predicates[p]:
+                    del self._predicates[p]
+            if not predicates:
+                del self.data[s]
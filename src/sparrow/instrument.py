@@ -0,0 +1,250 @@
+"""Instrumentation of the backend operations and conversions.
+
+Listeners are objects with ``start(event)`` and ``stop(event)`` methods.
+They are called around every ITripleStore and ISPARQLEndpoint method of
+the backends, and around the conversion stages in sparrow.utils::
+
+  >>> histogram = Histogram()
+  >>> add_listener(histogram)
+  >>> db.get_dict('wine')
+  >>> histogram.summary()['get_dict']['p50']
+
+Events of nested operations, like the parsing done by get_dict, are
+reported as well; ``event.parent`` is the event of the outer operation.
+Without listeners an instrumented call costs one check. Results that are
+read lazily, like those of iter_select, are timed until they are returned.
+"""
+import inspect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# a tuple, so calls can iterate it while listeners are added
+_listeners = ()
+_local = threading.local()
+
+
+def add_listener(listener):
+    global _listeners
+    _listeners = _listeners + (listener,)
+
+
+def remove_listener(listener):
+    global _listeners
+    _listeners = tuple(l for l in _listeners if l is not listener)
+
+
+def enabled():
+    """Returns whether there are listeners, to skip costly measurements"""
+    return bool(_listeners)
+
+
+class Event(object):
+    """An operation, with the amounts of data it handled"""
+
+    __slots__ = ('operation', 'backend', 'context', 'bytes_in', 'bytes_out',
+                 'triples', 'rows', 'start', 'seconds', 'error', 'parent')
+
+    def __init__(self, operation, backend=None, context=None, parent=None):
+        self.operation = operation
+        self.backend = backend
+        self.context = context
+        self.bytes_in = self.bytes_out = self.triples = self.rows = None
+        self.start = self.seconds = None
+        self.error = None
+        self.parent = parent
+
+    def __repr__(self):
+        return '<Event %s %s>' % (self.operation, self.seconds)
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def current():
+    """Returns the event of the innermost running operation, or None"""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def record(**amounts):
+    """Set bytes_in, bytes_out, triples or rows of the current event"""
+    if not _listeners:
+        return
+    event = current()
+    if event is not None:
+        for name, value in amounts.items():
+            setattr(event, name, value)
+
+
+@contextmanager
+def span(operation, backend=None, context=None):
+    """Reports the operation in the with block to the listeners"""
+    listeners = _listeners
+    if not listeners:
+        yield None
+        return
+    stack = _stack()
+    event = Event(operation, backend, context,
+                  stack[-1] if stack else None)
+    for listener in listeners:
+        listener.start(event)
+    stack.append(event)
+    event.start = time.perf_counter()
+    try:
+        yield event
+    except BaseException as err:
+        event.error = err
+        raise
+    finally:
+        event.seconds = time.perf_counter() - event.start
+        stack.pop()
+        for listener in listeners:
+            listener.stop(event)
+
+
+def instrumented(operation):
+    """Decorates a function to report calls as ``operation``"""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _listeners:
+                return function(*args, **kwargs)
+            with span(operation):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _context_index(function):
+    names = list(inspect.signature(function).parameters)
+    for name in ('context_name', 'context'):
+        if name in names:
+            return names.index(name), name
+    return None, None
+
+
+def instrument_method(method):
+    """Wraps a backend method to report calls by the method name"""
+    operation = method.__name__
+    index, name = _context_index(method)
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not _listeners:
+            return method(self, *args, **kwargs)
+        if index is not None and index <= len(args):
+            context = args[index - 1]
+        else:
+            context = kwargs.get(name)
+        with span(operation, type(self).__name__, context) as event:
+            result = method(self, *args, **kwargs)
+            if isinstance(result, list) and event.rows is None:
+                event.rows = len(result)
+            return result
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_class(cls, names):
+    """Instruments the methods in names defined by cls"""
+    for name in names:
+        method = cls.__dict__.get(name)
+        if callable(method) and not getattr(method, '__instrumented__',
+                                            False):
+            setattr(cls, name, instrument_method(method))
+
+
+class LoggingListener(object):
+    """Logs every finished operation"""
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger('sparrow.instrument')
+        self.level = level
+
+    def start(self, event):
+        pass
+
+    def stop(self, event):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        amounts = ''.join(' %s=%s' % (name, getattr(event, name))
+                          for name in ('context', 'bytes_in', 'bytes_out',
+                                       'triples', 'rows')
+                          if getattr(event, name) is not None)
+        self.logger.log(self.level, '%s%s %.3f ms%s%s',
+                        event.backend + '.' if event.backend else '',
+                        event.operation, event.seconds * 1000, amounts,
+                        ' failed: %r' % event.error if event.error else '')
+
+
+class Histogram(object):
+    """Durations of the operations in buckets of powers of two.
+
+    Bucket i counts the durations from 2 ** (i - 1) up to 2 ** i
+    microseconds, so percentiles are exact to a factor of two.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations = {}
+
+    def start(self, event):
+        pass
+
+    def stop(self, event):
+        micros = event.seconds * 1e6
+        bucket = max(0, math.ceil(math.log2(micros))) if micros > 1 else 0
+        with self._lock:
+            stats = self.operations.get(event.operation)
+            if stats is None:
+                stats = self.operations[event.operation] = {
+                    'count': 0, 'errors': 0, 'seconds': 0.0, 'max': 0.0,
+                    'bytes_in': 0, 'bytes_out': 0, 'triples': 0, 'rows': 0,
+                    'buckets': {}}
+            stats['count'] += 1
+            stats['seconds'] += event.seconds
+            stats['max'] = max(stats['max'], event.seconds)
+            if event.error is not None:
+                stats['errors'] += 1
+            for name in ('bytes_in', 'bytes_out', 'triples', 'rows'):
+                value = getattr(event, name)
+                if value:
+                    stats[name] += value
+            stats['buckets'][bucket] = stats['buckets'].get(bucket, 0) + 1
+
+    def percentile(self, operation, percent):
+        """Returns the upper bound in seconds of a percentile"""
+        with self._lock:
+            stats = self.operations[operation]
+            rank = stats['count'] * percent / 100.0
+            seen = 0
+            for bucket in sorted(stats['buckets']):
+                seen += stats['buckets'][bucket]
+                if seen >= rank:
+                    return min(2 ** bucket / 1e6, stats['max'])
+            return stats['max']
+
+    def summary(self):
+        """Returns the statistics of every operation"""
+        result = {}
+        for operation in list(self.operations):
+            with self._lock:
+                stats = dict(self.operations[operation])
+            del stats['buckets']
+            stats['mean'] = stats['seconds'] / stats['count']
+            for percent in (50, 90, 99):
+                stats['p%d' % percent] = self.percentile(operation, percent)
+            result[operation] = stats
+        return result
+
+    def clear(self):
+        with self._lock:
+            self.operations.clear()
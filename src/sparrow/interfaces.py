@@ -2,6 +2,12 @@ from zope.interface import Interface
 
 
 class ITripleStore(Interface):
+    """
+    A store of triples in named contexts
+
+    The data given to the add and remove methods may be gzip, bzip2 or
+    xz compressed, it is decompressed while it is read
+    """
 
     def connect(uri):
         """
@@ -41,36 +47,50 @@ class ITripleStore(Interface):
         """
         Add triples data in rdfxml format to a specific context
         
-        data can be either a URI string starting with 'http://' or 'file://',
-        it can also be a string containing the data, or a file like
-        object with a read, seek, and close method.      
+        data can be either a URI string starting with 'http://', 'https://'
+        or 'file://', it can also be a string containing the data, or a file
+        like object with a read, seek, and close method.
         """
 
     def add_ntriples(uri_string_or_file, context_name):
         """
         Add triples data in ntriples format to a specific context
         
-        data can be either a URI string starting with 'http://' or 'file://',
-        it can also be a string containing the data, or a file like
-        object with a read, seek, and close method.      
+        data can be either a URI string starting with 'http://', 'https://'
+        or 'file://', it can also be a string containing the data, or a file
+        like object with a read, seek, and close method.
         """
 
     def add_turtle(uri_string_or_file, context_name):
         """
         Add triples data in turtle format to a specific context
         
-        data can be either a URI string starting with 'http://' or 'file://',
-        it can also be a string containing the data, or a file like
-        object with a read, seek, and close method.      
+        data can be either a URI string starting with 'http://', 'https://'
+        or 'file://', it can also be a string containing the data, or a file
+        like object with a read, seek, and close method.
+        """
+
+    def bulk_load(sources, workers=None, batch_size=100000, progress=None):
+        """
+        Add many sources, an iterable of (data, format, context_name)
+        items, where format is 'ntriples', 'turtle', 'rdfxml' or 'json'
+        and data is as for the other add methods. A 'file://' URI can be
+        a glob pattern, like 'file:///dumps/*.nt.gz'.
+
+        The sources are converted on workers processes, if given, and
+        sent in batches of at least batch_size statements per context. A
+        source is never split over batches. progress is called with a
+        sparrow.bulk.LoadProgress after every batch, which is also
+        returned at the end.
         """
 
     def add_json(uri_string_or_file, context_name):
         """
         Add triples data in json format to a specific context
         
-        data can be either a URI string starting with 'http://' or 'file://',
-        it can also be a string containing the data, or a file like
-        object with a read, seek, and close method.      
+        data can be either a URI string starting with 'http://', 'https://'
+        or 'file://', it can also be a string containing the data, or a file
+        like object with a read, seek, and close method.
         """
 
     def add_dict(dictionary, context_name):
@@ -78,40 +98,53 @@ class ITripleStore(Interface):
         Add triples data as a python dictionary to a specific context
         """
 
+    def add_nquads(uri_string_or_file):
+        """
+        Add quads data in nquads format to the contexts named by the
+        graphs of the statements, <context:NAME> for context NAME.
+        The statements are added while they are read, a blank node label
+        only denotes the same node within a run of statements in the
+        same graph.
+
+        data can be either a URI string starting with 'http://', 'https://'
+        or 'file://', it can also be a string containing the data, or a file
+        like object with a read, seek, and close method.
+        """
+
     def remove_rdfxml(uri_string_or_file, context_name, base_uri):
         """
         Remove triples data in rdfxml format from a specific context
         
-        data can be either a URI string starting with 'http://' or 'file://',
-        it can also be a string containing the data, or a file like
-        object with a read, seek, and close method.      
+        data can be either a URI string starting with 'http://', 'https://'
+        or 'file://', it can also be a string containing the data, or a file
+        like object with a read, seek, and close method.
         """
 
     def remove_ntriples(uri_string_or_file, context_name):
         """
         Remove triples data in ntriples format from a specific context
         
-        data can be either a URI string starting with 'http://' or 'file://',
-        it can also be a string containing the data, or a file like
-        object with a read, seek, and close method.      
+        data can be either a URI string starting with 'http://', 'https://'
+        or 'file://', it can also be a string containing the data, or a file
+        like object with a read, seek, and close method.
         """
 
     def remove_turtle(uri_string_or_file, context_name):
         """
         Remove triples data in turtle format from a specific context
         
-        data can be either a URI string starting with 'http://' or 'file://',
-        it can also be a string containing the data, or a file like
-        object with a read, seek, and close method.      
+        data can be either a URI string starting with 'http://', 'https://'
+        or 'file://', it can also be a string containing the data, or a file
+        like object with a read, seek, and close method.
         """
 
     def remove_json(uri_string_or_file, context_name):
         """
         Remove triples data in json format from a specific context
         
-        data can be either a URI string starting with 'http://' or 'file://',
-        it can also be a string containing the data, or a file like
-        object with a read, seek, and close method.      
+        data can be either a URI string starting with 'http://', 'https://'
+        or 'file://', it can also be a string containing the data, or a file
+        like object with a read, seek, and close method.
         """
 
     def remove_dict(dictionary, context_name):
@@ -119,42 +152,111 @@ class ITripleStore(Interface):
         Remove triples data as a python dictionary from a specific context
         """
 
-    def get_rdfxml(context_name, pretty=False):
+    def get_rdfxml(context_name, pretty=False, compression=None):
         """
         Returns a file object (something with a read and close method)
         containing the triple data from a specific context in rdfxml format
+
+        compression can be 'gzip', 'bz2' or 'xz' to get a binary file
+        object that is compressed while it is read
         """
 
-    def get_ntriples(context_name):
+    def get_ntriples(context_name, compression=None):
         """
         Returns a file object (something with a read and close method)
         containing the triple data from a specific context in ntriples format
+
+        compression can be 'gzip', 'bz2' or 'xz' to get a binary file
+        object that is compressed while it is read
         """
 
-    def get_turtle(context_name):
+    def get_turtle(context_name, compression=None):
         """
         Returns a file object (something with a read and close method)
         containing the triple data from a specific context in turtle format
+
+        compression can be 'gzip', 'bz2' or 'xz' to get a binary file
+        object that is compressed while it is read
         """
 
-    def get_json(context_name):
+    def get_json(context_name, indent=True, compression=None):
         """
         Returns a file object (something with a read and close method)
-        containing the triple data from a specific context in json format
+        containing the triple data from a specific context in json format,
+        which is written while it is read. With indent None the json is
+        not pretty printed.
+
+        compression can be 'gzip', 'bz2' or 'xz' to get a binary file
+        object that is compressed while it is read
+        """
+
+    def get_nquads(compression=None):
+        """
+        Returns a file object (something with a read and close method)
+        containing the triple data from all contexts in nquads format,
+        statements in context NAME are in graph <context:NAME>. The
+        contexts are serialized one at a time, while the result is read.
+
+        compression can be 'gzip', 'bz2' or 'xz' to get a binary file
+        object that is compressed while it is read
         """
 
-    def get_dict(context_name):
+    def get_dict(context_name, parallel=None, terms=None):
         """
         Returns a python dictionary containing the triple data
         from a specific context
+
+        parallel can be a number of worker processes (or True for
+        one per core) used to parse large contexts, terms can be a
+        sparrow.utils.TermDict to intern the terms in
+        """
+
+    def get_columns(context_name, terms=None):
+        """
+        Returns the triples of a specific context as a
+        sparrow.utils.Columns, with the columns subject, predicate
+        and object as arrays of term ids
+
+        terms can be a sparrow.utils.TermDict to keep the term ids in
         """
 
 
 class ISPARQLEndpoint(Interface):
-    def select(sparql_query):
+    def select(sparql_query, terms=None):
         """
         Run a sparql SELECT query, returns a list
         of dictionaries in sparql result format (json-like)
+
+        terms can be a sparrow.utils.TermDict to intern the terms in
+        """
+
+    def iter_select(sparql_query, terms=None):
+        """
+        Run a sparql SELECT query, returns an iterator over the same
+        dictionaries as select, which are read from the result as they
+        are needed
+        """
+
+    def select_columns(sparql_query, terms=None):
+        """
+        Run a sparql SELECT query, returns a sparrow.utils.Columns
+        with a column of term ids per variable, which takes far less
+        memory than the dictionaries of select
+
+        terms can be a sparrow.utils.TermDict to keep the term ids in.
+        Other than SELECT queries raise a QueryError
+        """
+
+    def prepare(sparql_query):
+        """
+        Prepare a sparql query to run many times, returns an object with
+        the methods select, iter_select, select_columns, ask and
+        construct, which take a dictionary of bindings from variable
+        names to values in sparql result format (json-like)
+
+        Backends without native bindings, like Redland, add the values
+        in a VALUES clause at the end of the WHERE group. Blank nodes can
+        not be bound there, binding one raises a QueryError
         """
 
     def ask(sparql_query):
@@ -6,23 +6,28 @@ Author: Sean B. Palmer, inamidst.com
 """
 
 import codecs
+import mmap
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from itertools import tee, zip_longest
 
 from io import BytesIO
-from rdflib.compat import cast_bytes
-from rdflib.term import BNode as bNode
-from rdflib.term import Literal
-from rdflib.term import URIRef as URI
-from typing import Iterable, List
+from typing import Iterable, NamedTuple, Optional
+from uuid import uuid4
 
-__all__ = ['unquote', 'uriquote', 'Sink', 'NTriplesParser']
+__all__ = ['unquote', 'uriquote', 'readlines', 'iter_triples', 'Sink',
+           'NTriplesParser', 'split', 'map_parallel', 'parse_parallel',
+           'URI', 'BNode', 'Literal', 'to_rdflib', 'NQuadsParser',
+           'iter_quads', 'serialize']
 
 uriref = r'<([^:]+:[^\s"<>]*)>'
 literal = r'"([^"\\]*(?:\\.[^"\\]*)*)"'
 litinfo = r'(?:@([a-zA-Z]+(?:-[a-zA-Z0-9]+)*)|\^\^' + uriref + r')?'
 
-r_line = re.compile(r'([^\r\n]*)(?:\r\n|\r|\n)')
+r_eol = re.compile(r'\r\n|\r|\n')
+r_eol_bytes = re.compile(br'\r\n|\r|\n')
 r_wspace = re.compile(r'[ \t]*')
 r_wspaces = re.compile(r'[ \t]+')
 r_tail = re.compile(r'[ \t]*\.[ \t]*(#.*)?')
@@ -30,12 +35,38 @@ r_uriref = re.compile(uriref)
 r_nodeid = re.compile(r'_:([A-Za-z0-9_:]([-A-Za-z0-9_:.]*[-A-Za-z0-9_:])?)')
 r_literal = re.compile(literal + litinfo)
 
-bufsiz = 2048
+bufsiz = 1024 * 1024
 validate = False
 
 
 class Node(str):
-    pass
+    __slots__ = ()
+
+
+class URI(Node):
+    __slots__ = ()
+
+
+class BNode(Node):
+    __slots__ = ()
+
+
+class Literal(NamedTuple):
+    value: str
+    language: Optional[str] = None
+    datatype: Optional[URI] = None
+
+
+def to_rdflib(term):
+    """Convert a term emitted by the parser to the rdflib equivalent."""
+    import rdflib
+    if isinstance(term, Literal):
+        return rdflib.Literal(term.value, term.language,
+                              term.datatype and rdflib.URIRef(term.datatype))
+    elif isinstance(term, BNode):
+        return rdflib.BNode(term)
+    else:
+        return rdflib.URIRef(term)
 
 
 class ParseError(Exception):
@@ -50,19 +81,27 @@ class Sink(object):
         self.length += 1
         print(s, p, o)
 
+    def quad(self, s, p, o, g):
+        self.length += 1
+        print(s, p, o, g)
 
-quot = {
+
+r_safe = re.compile(r'([\x20\x21\x23-\x5B\x5D-\x7E]+)')
+
+r_escape = re.compile(
+    r'\\(?:([tbnrf"\'\\])|u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.?))', re.S)
+
+escapes = {
     't': u'\t',
+    'b': u'\b',
     'n': u'\n',
     'r': u'\r',
+    'f': u'\f',
     '"': u'"',
+    "'": u"'",
     '\\': u'\\'
 }
 
-r_safe = re.compile(r'([\x20\x21\x23-\x5B\x5D-\x7E]+)')
-r_quot = re.compile(r'\\([tnr"\\])')
-r_uniquot = re.compile(r'\\u([0-9A-F]{4})|\\U([0-9A-F]{8})')
-
 
 def pairs(xs: Iterable):
     i1, i2 = tee(xs)
@@ -70,67 +109,107 @@ def pairs(xs: Iterable):
     return zip_longest(i1, i2, fillvalue='')
 
 
-def translate(string):
-    escape = {'\\': '\\', '"': '"', "'": "'", 'f': '\f', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t'}
+def _codepoint(hexdigits):
+    codepoint = int(hexdigits, 16)
+    if codepoint > 0x10FFFF:
+        raise ParseError("Disallowed codepoint: %08X" % codepoint)
+    return chr(codepoint)
 
-    def helper(xs: List[str], ys: List[str]) -> List[str]:
-        if not xs:
-            return ys
-        elif len(xs) == 1:
-            if xs[0] != '\\':
-                return helper([], ys + xs)
-            else:
-                raise Exception(f'{xs}: invalid end of string')
-        else:
-            x, y, *xs = xs
-            if x == '\\':
-                if y in escape:
-                    return helper(xs, ys + [escape[y]])
-                else:
-                    raise Exception(f'{x}{y}: invalid escape')
-            else:
-                return helper([y] + xs, ys + [x])
 
-    return helper(string, [])
+def _unescape(m):
+    char, u, U, illegal = m.groups()
+    if char:
+        return escapes[char]
+    elif u or U:
+        return _codepoint(u or U)
+    elif illegal:
+        raise ParseError("Illegal escape: \\%s" % illegal)
+    else:
+        raise ParseError("Invalid end of string")
+
 
 def unquote(s):
-    """Unquote an N-Triples string."""
-    if not validate:
+    """Unquote an N-Triples string.
 
+    Escape sequences are replaced in a single pass over the string, so the
+    cost is linear in its length. When validating, the characters between
+    the escapes have to be printable ASCII as well.
+    """
+    if not validate:
         if isinstance(s, str):  # nquads
-            # return decodeUnicodeEscape(s)
-            escaped = ''.join(translate(s))
-            return escaped
+            if '\\' not in s:
+                return s
+            return r_escape.sub(_unescape, s)
         else:
             return s.decode('unicode-escape')
+    result = r_escape.sub(_unescape, s)
+    unescaped = r_escape.sub('', s)
+    if unescaped and not r_safe.fullmatch(unescaped):
+        raise ParseError("Illegal literal character: %r" %
+                         r_safe.sub('', unescaped)[0])
+    return result
+
+
+def readlines(f):
+    """Iterate over the lines of f, a binary or text file-like object.
+
+    N-Triples lines end in either CRLF, CR, or LF, so f.readline() can't
+    be used. Instead, blocks of ``bufsiz`` characters are split into lines
+    in bulk. A CR at the end of a block is kept for the next one, so a CRLF
+    split over two blocks ends a single line. The last line does not need
+    to be terminated.
+    """
+    decode = codecs.getincrementaldecoder('utf-8')().decode
+    pending = []
+    carry = ''
+    while True:
+        block = f.read(bufsiz)
+        if not block:
+            break
+        if not isinstance(block, str):
+            block = decode(block)
+        block = carry + block
+        carry = ''
+        if block.endswith('\r'):
+            block, carry = block[:-1], '\r'
+        lines = r_eol.split(block)
+        if len(lines) == 1:
+            pending.append(block)
+            continue
+        if pending:
+            pending.append(lines[0])
+            lines[0] = ''.join(pending)
+        pending = [lines.pop()]
+        yield from lines
+    pending.append(decode(b'', True))
+    last = ''.join(pending)
+    # a line ended by the carried CR is yielded even if it is empty
+    if last or carry:
+        yield last
+
+
+escape_table = str.maketrans({
+    '\\': '\\\\',
+    '"': '\\"',
+    '\n': '\\n',
+    '\r': '\\r',
+    '\t': '\\t'
+})
+
+
+def serialize(term):
+    """Serialize a term emitted by the parser in N-Triples syntax."""
+    if isinstance(term, Literal):
+        value = '"%s"' % term.value.translate(escape_table)
+        if term.language:
+            return '%s@%s' % (value, term.language)
+        elif term.datatype:
+            return '%s^^<%s>' % (value, term.datatype)
+        return value
+    elif isinstance(term, BNode):
+        return '_:' + term
     else:
-        result = []
-        while s:
-            m = r_safe.match(s)
-            if m:
-                s = s[m.end():]
-                result.append(m.group(1))
-                continue
-
-            m = r_quot.match(s)
-            if m:
-                s = s[2:]
-                result.append(quot[m.group(1)])
-                continue
-
-            m = r_uniquot.match(s)
-            if m:
-                s = s[m.end():]
-                u, U = m.groups()
-                codepoint = int(u or U, 16)
-                if codepoint > 0x10FFFF:
-                    raise ParseError("Disallowed codepoint: %08X" % codepoint)
-                result.append(chr(codepoint))
-            elif s.startswith('\\'):
-                raise ParseError("Illegal escape at: %s..." % s[:10])
-            else:
-                raise ParseError("Illegal literal character: %r" % s[0])
-        return u''.join(result)
+        return '<%s>' % term
 
 
 r_hibyte = re.compile(r'([\x80-\xFF])')
@@ -151,12 +230,28 @@ class NTriplesParser(object):
 
           p = NTriplesParser(sink=MySink())
           sink = p.parse(f) # file; use parsestring for a string
-    """
 
-    _bnode_ids = {}
+    or, without a sink::
+
+          for s, p, o in NTriplesParser().iter_triples(f):
+              ...
+
+    Terms are emitted as ``URI`` and ``BNode`` strings and ``Literal``
+    tuples, which are far smaller than their rdflib counterparts; use
+    ``to_rdflib`` to convert them.
+
+    Blank node labels are mapped to freshly generated ids. The mapping is
+    scoped to a single parse call, or to a ``session()`` spanning several
+    calls, and released afterwards. When a ``bnode_prefix`` is given,
+    labels are kept and prefixed with it instead and no mapping is needed;
+    use an empty prefix to keep the original labels as they are.
+    """
 
-    def __init__(self, sink=None):
+    def __init__(self, sink=None, bnode_prefix=None):
         self.line = None
+        self.bnode_prefix = bnode_prefix
+        self._bnode_ids = {}
+        self._in_session = False
         if sink is not None:
             self.sink = sink
         else:
@@ -164,61 +259,71 @@ class NTriplesParser(object):
 
     def parse(self, f):
         """Parse f as an N-Triples file."""
+        for triple in self.iter_triples(f):
+            self.sink.triple(*triple)
+        return self.sink
+
+    def iter_triples(self, f):
+        """Lazily yield the (s, p, o) triples in f, an N-Triples file.
+
+        Only the current block of input is kept in memory, so arbitrarily
+        large files can be processed one statement at a time.
+        """
         if not hasattr(f, 'read'):
             raise ParseError("Item to parse must be a file-like object.")
 
         # since N-Triples 1.1 files can and should be utf-8 encoded
-        f = codecs.getreader('utf-8')(f)
-
         self.file = f
-        self.buffer = ''
-        while True:
-            self.line = self.readline()
-            if self.line is None:
-                break
-            try:
-                self.parseline()
-            except ParseError:
-                raise ParseError("Invalid line: %r" % self.line)
-        return self.sink
+        self._lines = readlines(f)
+        if not self._in_session:
+            self._bnode_ids = {}
+        try:
+            for self.line in self._lines:
+                try:
+                    triple = self.statement()
+                except ParseError:
+                    raise ParseError("Invalid line: %r" % self.line)
+                if triple is not None:
+                    yield triple
+        finally:
+            if not self._in_session:
+                self._bnode_ids = {}
+
+    @contextmanager
+    def session(self):
+        """Treat all parse calls within the block as a single document.
+
+        Blank node labels then denote the same node in all of them. The
+        label mapping is released when the block exits.
+        """
+        self._bnode_ids = {}
+        self._in_session = True
+        try:
+            yield self
+        finally:
+            self._in_session = False
+            self._bnode_ids = {}
 
     def parsestring(self, s):
         """Parse s as an N-Triples string."""
         if not isinstance(s, str):
             raise ParseError("Item to parse must be a string instance.")
-        f = BytesIO()
-        f.write(cast_bytes(s))
-        f.seek(0)
-        self.parse(f)
+        self.parse(BytesIO(s.encode('utf-8')))
 
     def readline(self):
         """Read an N-Triples line from buffered input."""
-        # N-Triples lines end in either CRLF, CR, or LF
-        # Therefore, we can't just use f.readline()
-        if not self.buffer:
-            buffer = self.file.read(bufsiz)
-            if not buffer:
-                return None
-            self.buffer = buffer
-
-        while True:
-            m = r_line.match(self.buffer)
-            if m:  # the more likely prospect
-                self.buffer = self.buffer[m.end():]
-                return m.group(1)
-            else:
-                buffer = self.file.read(bufsiz)
-                if not buffer and not self.buffer.isspace():
-                    # Last line does not need to be terminated with a newline
-                    buffer += "\n"
-                elif not buffer:
-                    return None
-                self.buffer += buffer
+        return next(self._lines, None)
 
     def parseline(self):
+        triple = self.statement()
+        if triple is not None:
+            self.sink.triple(*triple)
+
+    def statement(self):
+        """Parse the current line, returns a triple or None."""
         self.eat(r_wspace)
         if (not self.line) or self.line.startswith('#'):
-            return  # The line is empty or a comment
+            return None  # The line is empty or a comment
 
         subject = self.subject()
         self.eat(r_wspaces)
@@ -231,7 +336,7 @@ class NTriplesParser(object):
 
         if self.line:
             raise ParseError("Trailing garbage")
-        self.sink.triple(subject, predicate, object)
+        return subject, predicate, object
 
     def peek(self, token):
         return self.line.startswith(token)
@@ -276,16 +381,13 @@ class NTriplesParser(object):
         if self.peek('_'):
             # Fix for https://github.com/RDFLib/rdflib/issues/204
             bnode_id = self.eat(r_nodeid).group(1)
-            new_id = self._bnode_ids.get(bnode_id, None)
-            if new_id is not None:
-                # Re-map to id specific to this doc
-                return bNode(new_id)
-            else:
+            if self.bnode_prefix is not None:
+                return BNode(self.bnode_prefix + bnode_id)
+            bnode = self._bnode_ids.get(bnode_id, None)
+            if bnode is None:
                 # Replace with freshly-generated document-specific BNode id
-                bnode = bNode()
-                # Store the mapping
-                self._bnode_ids[bnode_id] = bnode
-                return bnode
+                bnode = self._bnode_ids[bnode_id] = BNode('N' + uuid4().hex)
+            return bnode
         return False
 
     def literal(self):
@@ -307,6 +409,138 @@ class NTriplesParser(object):
             return Literal(lit, lang, dtype)
         return False
 
+
+class NQuadsParser(NTriplesParser):
+    """An N-Quads Parser.
+
+    Statements are (s, p, o, g) tuples, where g is None for statements
+    in the default graph. A sink receives them through its quad() method.
+    """
+
+    def parse(self, f):
+        """Parse f as an N-Quads file."""
+        for quad in self.iter_triples(f):
+            self.sink.quad(*quad)
+        return self.sink
+
+    def iter_quads(self, f):
+        """Lazily yield the (s, p, o, g) quads in f, an N-Quads file."""
+        return self.iter_triples(f)
+
+    def parseline(self):
+        quad = self.statement()
+        if quad is not None:
+            self.sink.quad(*quad)
+
+    def statement(self):
+        """Parse the current line, returns a quad or None."""
+        self.eat(r_wspace)
+        if (not self.line) or self.line.startswith('#'):
+            return None  # The line is empty or a comment
+
+        subject = self.subject()
+        self.eat(r_wspaces)
+
+        predicate = self.predicate()
+        self.eat(r_wspaces)
+
+        object = self.object()
+        self.eat(r_wspace)
+
+        graph = self.uriref() or self.nodeid() or None
+        self.eat(r_tail)
+
+        if self.line:
+            raise ParseError("Trailing garbage")
+        return subject, predicate, object, graph
+
+
+def iter_triples(f):
+    """Lazily yield the (s, p, o) triples in f, an N-Triples file."""
+    return NTriplesParser().iter_triples(f)
+
+
+def iter_quads(f):
+    """Lazily yield the (s, p, o, g) quads in f, an N-Quads file."""
+    return NQuadsParser().iter_quads(f)
+
+
+def split(data, parts):
+    """Split data, bytes or an mmap, into about ``parts`` ranges.
+
+    Returns a list of (start, end) offsets; every range ends on a line
+    boundary, so each one can be parsed on its own.
+    """
+    size = len(data)
+    ranges = []
+    start = 0
+    for i in range(1, parts + 1):
+        if start >= size:
+            break
+        end = size * i // parts
+        if end <= start:
+            continue
+        m = r_eol_bytes.search(data, end - 1) if end < size else None
+        end = m.end() if m else size
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def read_range(source, start, end):
+    """Read the bytes from start to end of the file at path ``source``."""
+    with open(source, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def _parse_range(source, start, end, bnode_prefix):
+    data = source[start:end] if isinstance(source, bytes) else \
+        read_range(source, start, end)
+    parser = NTriplesParser(bnode_prefix=bnode_prefix)
+    return list(parser.iter_triples(BytesIO(data)))
+
+
+def map_parallel(func, source, workers=None, bnode_prefix=None):
+    """Apply func to line aligned ranges of source in a process pool.
+
+    source is either the path of an N-Triples file or its content as bytes.
+    ``func(source, start, end, bnode_prefix)`` must be a module level
+    function; it is called once per range, and the results are returned
+    in input order. All ranges share one ``bnode_prefix``, so a blank node
+    label used in several ranges still denotes the same node.
+    """
+    workers = workers or os.cpu_count() or 1
+    if bnode_prefix is None:
+        bnode_prefix = 'N%s' % uuid4().hex
+    if isinstance(source, bytes):
+        ranges = split(source, workers)
+        # only send each worker its own part of the data
+        jobs = [(source[start:end], 0, end - start) for start, end in ranges]
+    else:
+        with open(source, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                ranges = split(data, workers)
+        jobs = [(source, start, end) for start, end in ranges]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(func, source, start, end, bnode_prefix)
+                   for source, start, end in jobs]
+        return [future.result() for future in futures]
+
+
+def parse_parallel(source, workers=None):
+    """Parse source, a path or bytes, on ``workers`` processes.
+
+    Returns the list of (s, p, o) triples in input order.
+    """
+    return [triple
+            for triples in map_parallel(_parse_range, source, workers)
+            for triple in triples]
+
+
 # # Obsolete, unused
 # def parseURI(uri):
 #     import urllib
@@ -4,7 +4,7 @@ import traceback
 from typing import Optional
 
 from io import BytesIO
-from rdflib import URIRef, plugin
+from rdflib import BNode, Literal, URIRef, Variable, plugin
 from rdflib.store import Store
 from six.moves import StringIO
 from zope.interface import implementer
@@ -17,10 +17,46 @@ from rdflib.plugins.memory import IOMemory
 #     print('problems importing rdflib: %s', e)
 #     rdflib = Graph = ConjunctiveGraph = IOMemory = None
 
-from .base_backend import BaseBackend
+from .base_backend import BaseBackend, BoundQuery, modifies
 from .error import ConnectionError, TripleStoreError, QueryError
 from .interfaces import ITripleStore, ISPARQLEndpoint
-from .utils import parse_sparql_result, ntriples_to_dict, ntriples_to_json
+from .utils import compress, ntriples_to_dict, ntriples_to_json
+
+
+def iter_bindings(result, terms=None):
+    """Yield the rows of an rdflib SELECT result as binding dicts,
+    like utils.parse_sparql_result does for a SPARQL XML result
+    """
+    intern = str if terms is None else terms.intern
+    names = [intern(str(var)) for var in result.vars]
+    for row in result:
+        data = {}
+        for name, term in zip(names, row):
+            if term is None:
+                continue  # unbound
+            elif isinstance(term, Literal):
+                value = {'value': str(term), 'type': 'literal'}
+                if term.language:
+                    value['lang'] = intern(term.language)
+                elif term.datatype:
+                    value['datatype'] = intern(str(term.datatype))
+            elif isinstance(term, BNode):
+                value = {'value': intern(str(term)), 'type': 'bnode'}
+            else:
+                value = {'value': intern(str(term)), 'type': 'uri'}
+            data[name] = value
+        yield data
+
+
+def to_term(value):
+    """Returns the rdflib term of a value dict"""
+    if value['type'] == 'uri':
+        return URIRef(value['value'])
+    elif value['type'] == 'bnode':
+        return BNode(value['value'])
+    datatype = value.get('datatype')
+    return Literal(value['value'], lang=value.get('lang'),
+                   datatype=URIRef(datatype) if datatype else None)
 
 
 @implementer(ITripleStore, ISPARQLEndpoint)
@@ -79,16 +115,19 @@ class RDFLibTripleStore(BaseBackend):
             # print(f'>>> exception:\n{traceback.format_exc()}')
             raise TripleStoreError(err)
 
+    @modifies
     def add_rdfxml(self, data, context, base_uri):
         data = self._get_file(data)
         graph = Graph(store=self._store, identifier=context)
         self._parse(graph, data, 'xml', base_uri)
 
+    @modifies
     def add_ntriples(self, data, context):
         data = self._get_file(data)
         graph = Graph(store=self._store, identifier=context)
         self._parse(graph, data, 'nt')
 
+    @modifies
     def add_turtle(self, data, context):
         data = self._get_file(data)
         graph = Graph(store=self._store, identifier=context)
@@ -100,23 +139,29 @@ class RDFLibTripleStore(BaseBackend):
         return StringIO(graph.serialize(format=format).decode('utf-8'))
         # return BytesIO(graph.serialize(format=format))
 
-    def get_rdfxml(self, context, pretty=False):
-        return self._serialize(self._get_context(context), 'xml')
+    def get_rdfxml(self, context, pretty=False, compression=None):
+        data = self._serialize(self._get_context(context), 'xml')
+        return compress(data, compression)
 
-    def get_turtle(self, context):
-        return self._serialize(self._get_context(context), 'n3')
+    def get_turtle(self, context, compression=None):
+        data = self._serialize(self._get_context(context), 'n3')
+        return compress(data, compression)
 
-    def get_ntriples(self, context):
-        return self._serialize(self._get_context(context), 'nt')
+    def get_ntriples(self, context, compression=None):
+        data = self._serialize(self._get_context(context), 'nt')
+        return compress(data, compression)
 
+    @modifies
     def remove_rdfxml(self, data, context, base_uri):
         data = self._get_file(data)
         self._remove(data, context, 'xml', base_uri)
 
+    @modifies
     def remove_ntriples(self, data, context):
         data = self._get_file(data)
         self._remove(data, context, 'nt')
 
+    @modifies
     def remove_turtle(self, data, context):
         data = self._get_file(data)
         self._remove(data, context, 'n3')
@@ -129,6 +174,7 @@ class RDFLibTripleStore(BaseBackend):
         for triple in graph:
             self._store.remove(triple, context)
 
+    @modifies
     def clear(self, context):
         # type: (str) -> None
         context = self._get_context(context)
@@ -142,16 +188,42 @@ class RDFLibTripleStore(BaseBackend):
 
         return len(self._store)
 
+    def _prepare(self, sparql):
+        # imported here, the sparql plugin imports requests
+        from rdflib.plugins.sparql import prepareQuery
+        # prefixes are resolved with the namespaces bound at this point
+        graph = ConjunctiveGraph(self._store)
+        try:
+            return prepareQuery(sparql, initNs=dict(graph.namespaces()))
+        except Exception as err:
+            raise QueryError(err)
+
+    def _bind(self, query, bindings):
+        return BoundQuery(query, {Variable(name): to_term(value)
+                                  for name, value in bindings.items()})
+
     def _query(self, sparql):
+        graph = ConjunctiveGraph(self._store)
         try:
-            result = ConjunctiveGraph(self._store).query(sparql)
+            if isinstance(sparql, BoundQuery):
+                # the parsed query is reused, only the bindings change
+                return graph.query(sparql.query,
+                                   initBindings=sparql.bindings)
+            return graph.query(sparql)
         except Exception as err:
             raise QueryError(err)
-        return result
 
-    def select(self, sparql):
+    def select(self, sparql, terms=None):
+        result = self._query(sparql)
+        if result.type == 'ASK':
+            return result.askAnswer
+        return list(iter_bindings(result, terms))
+
+    def iter_select(self, sparql, terms=None):
         result = self._query(sparql)
-        return parse_sparql_result(result.serialize())
+        if result.type == 'ASK':
+            return iter([result.askAnswer])
+        return iter_bindings(result, terms)
 
     def ask(self, sparql):
         result = self._query(sparql)
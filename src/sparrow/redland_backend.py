@@ -8,10 +8,11 @@ try:
 except ImportError:
     RDF = None
 
-from sparrow.base_backend import BaseBackend
+from sparrow.base_backend import BaseBackend, modifies
 from sparrow.error import ConnectionError, TripleStoreError, QueryError
 from sparrow.interfaces import ITripleStore, ISPARQLEndpoint
-from sparrow.utils import (parse_sparql_result,
+from sparrow.utils import (compress,
+                           iter_sparql_result,
                            ntriples_to_dict,
                            ntriples_to_json)
 
@@ -34,14 +35,17 @@ class RedlandTripleStore(BaseBackend):
     def register_prefix(self, prefix, namespace):
         self._nsmap[prefix] = namespace
 
+    @modifies
     def add_rdfxml(self, data, context_name, base_uri):
         data = self._get_file(data)
         self._add_stream(self._parse(data, 'rdfxml', base_uri), context_name)
         
+    @modifies
     def add_ntriples(self, data, context_name):
         data = self._get_file(data)
         self._add_stream(self._parse(data, 'ntriples', '-'), context_name)
 
+    @modifies
     def add_turtle(self, data, context_name):
         data = self._get_file(data)
         self._add_stream(self._parse(data, 'turtle', '-'), context_name)
@@ -69,18 +73,18 @@ class RedlandTripleStore(BaseBackend):
             raise TripleStoreError('Parsing RDF Failed')
         return stream
 
-    def get_rdfxml(self, context_name, pretty=False):
+    def get_rdfxml(self, context_name, pretty=False, compression=None):
         if pretty:
             format = 'rdfxml-abbrev'
         else:
             format = 'rdfxml'
-        return self._serialize(context_name, format)
+        return compress(self._serialize(context_name, format), compression)
 
-    def get_ntriples(self, context_name):
-        return self._serialize(context_name, 'ntriples')
+    def get_ntriples(self, context_name, compression=None):
+        return compress(self._serialize(context_name, 'ntriples'), compression)
         
-    def get_turtle(self, context_name):
-        return self._serialize(context_name, 'turtle')
+    def get_turtle(self, context_name, compression=None):
+        return compress(self._serialize(context_name, 'turtle'), compression)
     
     def _serialize(self, context_name, format):
         # this sucks, we need a temp model because contexts can not
@@ -101,14 +105,17 @@ class RedlandTripleStore(BaseBackend):
 
         return StringIO(serializer.serialize_model_to_string(temp))
 
+    @modifies
     def remove_rdfxml(self, data, context_name, base_uri):
         data = self._get_file(data)
         self._remove(data, 'rdfxml', context_name, base_uri)
 
+    @modifies
     def remove_turtle(self, data, context_name):
         data = self._get_file(data)
         self._remove(data, 'turtle', context_name, '-')
 
+    @modifies
     def remove_ntriples(self, data, context_name):
         data = self._get_file(data)
         self._remove(data, 'ntriples', context_name, '-')
@@ -122,6 +129,7 @@ class RedlandTripleStore(BaseBackend):
         for statement in stream:
             self._model.remove_statement(statement, context)
         
+    @modifies
     def clear(self, context):
         # if isinstance(context, unicode):
         #     context = context.encode('utf8')
@@ -144,11 +152,14 @@ class RedlandTripleStore(BaseBackend):
             raise QueryError(err)
         return result
 
-    def select(self, sparql):
+    def select(self, sparql, terms=None):
+        return list(self.iter_select(sparql, terms))
+
+    def iter_select(self, sparql, terms=None):
         result = self._query(sparql)
         if not result.is_bindings():
             raise QueryError('SELECT Query did not return bindings')
-        return parse_sparql_result(result.to_string())
+        return iter_sparql_result(result.to_string(), terms)
         
     def ask(self, sparql):
         result = self._query(sparql)
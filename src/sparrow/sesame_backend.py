@@ -1,7 +1,8 @@
 import os
 import shutil
 import subprocess
-from io import StringIO, BytesIO
+import threading
+from io import BufferedReader, BytesIO, StringIO, TextIOWrapper
 from os.path import join
 from urllib.parse import urlparse, quote, urlencode
 
@@ -9,27 +10,63 @@ import requests
 from lxml import etree
 from zope.interface import implementer
 
-from sparrow.base_backend import BaseBackend
+from sparrow.base_backend import BaseBackend, BoundQuery, modifies
 from sparrow.error import ConnectionError, TripleStoreError, QueryError
 from sparrow.interfaces import ITripleStore, ISPARQLEndpoint
-from sparrow.utils import (parse_sparql_result,
+from sparrow import instrument, ntriples
+from sparrow.instrument import instrumented
+from sparrow.ntriples import ParseError
+from sparrow.utils import (compress,
+                           IterStream,
+                           parse_sparql_result,
+                           sparql_result_parser,
                            ntriples_to_dict,
-                           ntriples_to_json)
+                           ntriples_to_json,
+                           value_to_ntriples)
 
+# SPARQL result formats, cheapest to decode first. Iterating prefers the
+# formats that can be decoded while reading, TSV has no boolean results.
+SELECT_ACCEPT = ('text/tab-separated-values, '
+                 'application/sparql-results+json;q=0.9, '
+                 'application/sparql-results+xml;q=0.8')
+ITER_SELECT_ACCEPT = ('text/tab-separated-values, '
+                      'application/sparql-results+xml;q=0.9')
+ASK_ACCEPT = ('application/sparql-results+json, '
+              'application/sparql-results+xml;q=0.9')
 
+
+@instrumented('sesame.to_bytes')
 def to_bytes(response: requests.Response) -> bytes:
     with BytesIO() as f:
         for chunk in response.iter_content(chunk_size=128):
             f.write(chunk)
+        instrument.record(bytes_in=f.tell())
         return f.getvalue()
 
 
 @implementer(ITripleStore, ISPARQLEndpoint)
 class SesameTripleStore(BaseBackend):
 
+    # number of requests AsyncTripleStore runs at the same time
+    max_concurrency = 16
+
     def __init__(self):
         self._nsmap = {}
         self._name = self._url = None
+        # a requests.Session is not thread safe, every thread that calls
+        # the backend, like those of AsyncTripleStore, gets its own
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    @property
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            with self._lock:
+                self._sessions.append(session)
+        return session
 
     def connect(self, dburi):
         url = urlparse(dburi)
@@ -37,7 +74,7 @@ class SesameTripleStore(BaseBackend):
         # self._url = 'http://%s/openrdf-sesame' % url.netloc
         self._url = 'http://%s/rdf4j-server' % url.netloc
         try:
-            resp = requests.get(
+            resp = self._session.get(
                 f'{self._url}/repositories',
                 headers={'Accept': 'application/sparql-results+xml'})
         except requests.ConnectionError as err:
@@ -53,10 +90,14 @@ class SesameTripleStore(BaseBackend):
             raise ConnectionError('Server has no repository: %s' % self._name)
 
     def disconnect(self):
-        pass
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self._local = threading.local()
 
     def contexts(self):
-        resp = requests.get(
+        resp = self._session.get(
             f'{self._url}/repositories/{self._name}/contexts',
             headers={'Accept': 'application/sparql-results+xml'})
 
@@ -66,6 +107,7 @@ class SesameTripleStore(BaseBackend):
     @staticmethod
     def _get_mimetype(format):
         return {'ntriples': 'text/plain',
+                'nquads': 'text/x-nquads',
                 'rdfxml': 'application/rdf+xml',
                 'turtle': 'application/x-turtle',
                 'n3': 'text/rdf+n3',
@@ -81,7 +123,7 @@ class SesameTripleStore(BaseBackend):
         self._nsmap[prefix] = namespace
 
         content_len = str(len(namespace))
-        resp = requests.put(
+        resp = self._session.put(
             f'{self._url}/repositories/{self._name}/namespaces/{prefix}',
             data=namespace,
             headers={"Content-length": content_len})
@@ -89,51 +131,96 @@ class SesameTripleStore(BaseBackend):
         if resp.status_code != 204:
             raise TripleStoreError(resp)
 
+    @modifies
     def add_rdfxml(self, data, context, base_uri):
         data = self._get_file(data)
         self._add(data, 'rdfxml', context, base_uri)
 
+    @modifies
     def add_ntriples(self, data, context):
         data = self._get_file(data)
         self._add(data, 'ntriples', context)
 
+    @modifies
     def add_turtle(self, data, context):
         data = self._get_file(data)
         self._add(data, 'turtle', context)
 
+    @modifies
+    def add_nquads(self, data):
+        # the server reads the contexts from the graphs of the statements
+        data = self._get_file(data)
+        self._add(data, 'nquads', None)
+
+    @staticmethod
+    def _iter_body(file):
+        # sends the data in chunks as it is read
+        try:
+            while True:
+                chunk = file.read(ntriples.bufsiz)
+                if not chunk:
+                    break
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                yield chunk
+        finally:
+            file.close()
+
     def _add(self, file, format, context, base_uri=None):
-        data = file.read()
-        file.close()
-        clength = str(len(data))
         ctype = self._get_mimetype(format)
-        params = {'context': self._get_context(context)}
+        params = {}
+        if context is not None:
+            params['context'] = self._get_context(context)
         if base_uri:
             params['baseURI'] = '<%s>' % base_uri
 
-        resp = requests.post(
+        resp = self._session.post(
             f'{self._url}/repositories/{self._name}/statements?{urlencode(params)}',
-            data=data,
-            headers={"Content-type": ctype,
-                     "Content-length": clength})
+            data=self._iter_body(file),
+            headers={"Content-type": ctype})
 
         if resp.status_code != 204:
             raise TripleStoreError(resp.status_code)
 
-    def get_rdfxml(self, context):
-        return self._serialize('rdfxml', context)
+    def get_rdfxml(self, context, compression=None):
+        return compress(self._serialize('rdfxml', context), compression)
 
-    def get_turtle(self, context):
-        return self._serialize('turtle', context)
+    def get_turtle(self, context, compression=None):
+        return compress(self._serialize('turtle', context), compression)
 
-    def get_ntriples(self, context):
-        return self._serialize('ntriples', context)
+    def get_ntriples(self, context, compression=None):
+        return compress(self._serialize('ntriples', context), compression)
+
+    def get_nquads(self, compression=None):
+        # a dump of the whole repository is streamed while it is read
+        resp = self._session.get(
+            f'{self._url}/repositories/{self._name}/statements',
+            headers={'Accept': self._get_mimetype('nquads')}, stream=True)
+        if resp.status_code != 200:
+            resp.close()
+            raise TripleStoreError(resp.status_code)
+        resp.raw.decode_content = True
+        result = IterStream(self._iter_content(resp))
+        if compression is not None:
+            return compress(result, compression)
+        return TextIOWrapper(BufferedReader(result), encoding='utf-8')
+
+    @staticmethod
+    def _iter_content(resp):
+        # the response is closed at the end, or when the stream is closed
+        try:
+            yield from resp.iter_content(ntriples.bufsiz)
+        finally:
+            resp.close()
 
     def _serialize(self, format, context, pretty=False):
-        quoted_context = quote(self._get_context(context))
         ctype = self._get_mimetype(format)
+        params = ''
+        if context is not None:
+            params = '?context=' + quote(self._get_context(context))
 
-        resp = requests.get(
-            f'{self._url}/repositories/{self._name}/statements?context={quoted_context}',
+        resp = self._session.get(
+            f'{self._url}/repositories/{self._name}/statements{params}',
             headers={"Accept": ctype})
 
         if resp.status_code != 200:
@@ -141,39 +228,39 @@ class SesameTripleStore(BaseBackend):
         else:
             return StringIO(resp.text)
 
+    @modifies
     def remove_rdfxml(self, data, context, base_uri):
         data = self._get_file(data)
         self._remove(data, 'rdfxml', context, base_uri)
 
+    @modifies
     def remove_turtle(self, data, context):
         data = self._get_file(data)
         self._remove(data, 'turtle', context)
 
+    @modifies
     def remove_ntriples(self, data, context):
         data = self._get_file(data)
         self._remove(data, 'ntriples', context)
 
     def _remove(self, file, format, context, base_uri=None):
-        data = file.read()
-        file.close()
-        clength = str(len(data))
         ctype = self._get_mimetype(format)
         params = {'context': self._get_context(context)}
         if base_uri:
             params['baseURI'] = '<%s>' % base_uri
         params = urlencode(params)
-        content = requests.delete(
+        content = self._session.delete(
             f'{self._url}/repositories/{self._name}/statements?{params}',
-            data=data,
-            headers={"Content-type": ctype,
-                     "Content-length": clength})
+            data=self._iter_body(file),
+            headers={"Content-type": ctype})
 
         if content.status_code != 204:
             raise TripleStoreError(content)
 
+    @modifies
     def clear(self, context):
         context = quote(self._get_context(context))
-        resp = requests.delete(
+        resp = self._session.delete(
             f'{self._url}/repositories/{self._name}/statements?context={context}')
 
         if resp.status_code != 204:
@@ -181,70 +268,92 @@ class SesameTripleStore(BaseBackend):
 
     def count(self, context=None):
         context = '?context=' + quote(self._get_context(context)) if context else ''
-        resp = requests.get(f'{self._url}/repositories/{self._name}/size{context}')
+        resp = self._session.get(f'{self._url}/repositories/{self._name}/size{context}')
 
         if resp.status_code != 200:
             raise TripleStoreError(resp)
         else:
             return int(resp.text)
 
-    def select(self, sparql):
-        params = urlencode({'query': sparql,
-                            'queryLn': 'SPARQL',
-                            'infer': 'false'})
+    def _bind(self, query, bindings):
+        # bound by the server, see _query
+        return BoundQuery(query, bindings)
+
+    def _query(self, sparql, accept, stream=False):
+        bindings = {}
+        if isinstance(sparql, BoundQuery):
+            sparql, bindings = sparql
+        params = {'query': sparql,
+                  'queryLn': 'SPARQL',
+                  'infer': 'false'}
+        for name, value in bindings.items():
+            params['$' + name] = value_to_ntriples(value)
+        params = urlencode(params)
 
-        content = requests.get(
-            f'{self._url}/repositories/{self._name}?{params}',
-            headers={'Accept': 'application/sparql-results+xml'})
+        with instrument.span('sesame.http', type(self).__name__) as event:
+            resp = self._session.get(
+                f'{self._url}/repositories/{self._name}?{params}',
+                headers={'Accept': accept},
+                stream=stream)
+            if event is not None:
+                length = resp.headers.get('Content-Length')
+                event.bytes_out = len(params)
+                event.bytes_in = int(length) if length else None
 
-        if content.status_code != 200:
-            raise QueryError(content.status_code)
+        if resp.status_code != 200:
+            raise QueryError(resp.status_code)
+        return resp
 
-        # Allegro Graph returns status 200 when parsing failed
-        if content.text.startswith('Server error:'):
-            raise QueryError(content[14:])
+    def select(self, sparql, terms=None):
+        results = list(self._select(sparql, SELECT_ACCEPT, terms))
+        if len(results) == 1 and isinstance(results[0], bool):
+            # the result of an ASK query
+            return results[0]
+        return results
 
-        return parse_sparql_result(to_bytes(content))
+    def iter_select(self, sparql, terms=None):
+        return self._select(sparql, ITER_SELECT_ACCEPT, terms)
 
-    def ask(self, sparql):
-        params = urlencode({'query': sparql,
-                            'queryLn': 'SPARQL',
-                            'infer': 'false'})
+    def _select(self, sparql, accept, terms):
+        resp = self._query(sparql, accept, stream=True)
+        # decode gzipped responses while reading
+        resp.raw.decode_content = True
+        return self._iter_results(resp, terms)
 
-        resp = requests.get(
-            f'{self._url}/repositories/{self._name}?{params}',
-            headers={'Accept': 'application/sparql-results+xml'})
+    @staticmethod
+    def _iter_results(resp, terms):
+        parse = sparql_result_parser(resp.headers.get('Content-Type'))
+        try:
+            yield from parse(resp.raw, terms)
+        except (etree.XMLSyntaxError, ValueError, ParseError):
+            # Allegro Graph returns status 200 when parsing failed
+            raise QueryError('Invalid query result')
+        finally:
+            resp.close()
 
-        if resp.status_code != 200:
-            raise QueryError(resp.status_code)
+    def ask(self, sparql):
+        resp = self._query(sparql, ASK_ACCEPT)
 
         # Allegro Graph returns status 200 when parsing failed
         if resp.text.startswith('Server error:'):
-            raise QueryError(resp[14:])
+            raise QueryError(resp.text[14:])
 
-        return parse_sparql_result(to_bytes(resp))
+        parse = sparql_result_parser(resp.headers.get('Content-Type'))
+        try:
+            return next(parse(to_bytes(resp)))
+        except (etree.XMLSyntaxError, ValueError, StopIteration):
+            raise QueryError('Invalid query result')
 
     def construct(self, sparql, fmt):
         out_format = fmt
         if fmt in ('json', 'dict'):
             out_format = 'ntriples'
         ctype = self._get_mimetype(out_format)
-        params = urlencode({
-            'query': sparql,
-            'queryLn': 'SPARQL',
-            'infer': 'false'})
-
-        # content: bytes
-        resp = requests.get(
-            f'{self._url}/repositories/{self._name}?{params}',
-            headers={'Accept': ctype})
-
-        if resp.status_code != 200:
-            raise QueryError(resp.status_code)
+        resp = self._query(sparql, ctype)
 
         # Allegro Graph returns status 200 when parsing failed
         if resp.text.startswith('Server error:'):
-            raise QueryError(resp[14:])
+            raise QueryError(resp.text[14:])
 
         if fmt == 'json':
             return ntriples_to_json(BytesIO(to_bytes(resp)))
@@ -1,4 +1,9 @@
+import bz2
+import gzip
+import lzma
 import os
+import shutil
+import tempfile
 from io import BytesIO
 from unittest import TestCase
 
@@ -138,6 +143,79 @@ class TripleStoreTest(TestCase):
         count = self.db.count()
         self.assertEqual(count, 0)
 
+    def test_nquads(self: ITripleStore):
+        self.db.add_ntriples(open_test_file('ntriples'), 'a')
+        self.db.add_ntriples(open_test_file('ntriples'), 'b')
+        data = self.db.get_nquads().read()
+        self.assertTrue('Wine Ontology" <context:a> .' in data)
+        self.db.clear('a')
+        self.db.clear('b')
+        self.db.add_nquads(data)
+        self.assertEqual(sorted(list(self.db.contexts())), ['a', 'b'])
+        self.assertTrue('Wine Ontology' in self.db.get_ntriples('b').read())
+        self.db.clear('a')
+        self.db.clear('b')
+        # a graph may come back after statements in other graphs
+        self.db.add_nquads('<uri:a> <uri:b> "1" <context:a> .\n'
+                           '<uri:a> <uri:b> "2" <context:b> .\n'
+                           '<uri:a> <uri:b> "3" <context:a> .\n')
+        self.assertEqual(self.db.count('a'), 2)
+        self.assertEqual(self.db.count('b'), 1)
+        self.db.clear('a')
+        self.db.clear('b')
+
+    def test_compressed(self: ITripleStore):
+        with open_test_file('turtle') as f:
+            data = gzip.compress(f.read())
+        self.db.add_turtle(BytesIO(data), 'test')
+        with tempfile.NamedTemporaryFile(suffix='.nt.bz2') as f:
+            with open_test_file('ntriples') as nt:
+                f.write(bz2.compress(nt.read()))
+            f.flush()
+            self.db.add_ntriples('file://' + f.name, 'test2')
+        for context in ('test', 'test2'):
+            data = self.db.get_ntriples(context, compression='xz').read()
+            self.assertTrue(b'Wine Ontology' in lzma.decompress(data))
+        self.db.clear('test2')
+
+    def test_bulk_load(self: ITripleStore):
+        tmp = tempfile.mkdtemp()
+        try:
+            for i in range(3):
+                with open(os.path.join(tmp, 'a%d.nt.gz' % i), 'wb') as f:
+                    f.write(gzip.compress(
+                        b'_:x <uri:p> "%d" .\n_:x <uri:q> <uri:o> .\n' % i))
+            reports = []
+            with open_test_file('turtle') as f:
+                result = self.db.bulk_load(
+                    [('file://%s/a*.nt.gz' % tmp, 'ntriples', 'test'),
+                     (f, 'turtle', 'test2')],
+                    workers=2, batch_size=4, progress=reports.append)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(result.sources, 4)
+        # a batch is sent after the second file, and at the end
+        self.assertEqual(reports[0].statements, 4)
+        self.assertEqual(len(reports), 3)
+        self.assertEqual(reports[-1].statements, result.statements)
+        self.assertTrue(result.statements > 1500)
+        # blank nodes of different sources are kept apart
+        data = self.db.get_dict('test')
+        self.assertEqual(len(data), 3)
+        self.assertTrue('Wine Ontology' in self.db.get_ntriples('test2').read())
+        self.db.clear('test2')
+        self.assertRaises(TripleStoreError, self.db.bulk_load,
+                          [('<uri:a> <uri:b> .', 'ntriples', 'test')])
+
+    def test_get_columns(self: ITripleStore):
+        with open_test_file('ntriples') as f:
+            self.db.add_ntriples(f, 'test')
+        columns = self.db.get_columns('test')
+        self.assertEqual(list(columns), ['subject', 'predicate', 'object'])
+        lines = self.db.get_ntriples('test').read().split('\n')
+        self.assertEqual(len(columns), len([l for l in lines if l.strip()]))
+        self.assertIn('Wine Ontology', columns.values('object'))
+
     def test_contexts(self: ITripleStore):
         self.assertEqual(list(self.db.contexts()), [])
         self.db.add_ntriples(open_test_file('ntriples'), 'a')
@@ -184,6 +262,54 @@ class TripleStoreQueryTest(TestCase):
             'RieslingGrape', 'SangioveseGrape', 'SauvignonBlancGrape',
             'SemillonGrape', 'ZinfandelGrape'])
 
+    def test_iter_select(self: ISPARQLEndpoint):
+        q = """
+        prefix vin: <http://www.w3.org/TR/2003/PR-owl-guide-20031209/wine#>
+        select ?grape
+        where { ?grape a vin:WineGrape .}
+        """
+        results = self.db.iter_select(q)
+        self.assertEqual(next(results)['grape']['type'], 'uri')
+        self.assertEqual(len(list(results)), 15)
+
+    def test_select_columns(self: ISPARQLEndpoint):
+        q = """
+        prefix vin: <http://www.w3.org/TR/2003/PR-owl-guide-20031209/wine#>
+        select ?grape
+        where { ?grape a vin:WineGrape .}
+        """
+        columns = self.db.select_columns(q)
+        self.assertEqual(len(columns), 16)
+        self.assertEqual(sorted(to_tuple(columns.binding(i)) for i in range(16)),
+                         sorted(to_tuple(r) for r in self.db.select(q)))
+        self.assertRaises(QueryError, self.db.select_columns, """
+        prefix vin: <http://www.w3.org/TR/2003/PR-owl-guide-20031209/wine#>
+        ask { ?grape a vin:WineGrape .}
+        """)
+
+    def test_prepare(self: ISPARQLEndpoint):
+        query = self.db.prepare("""
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        SELECT ?label
+        WHERE { ?x rdfs:label ?label .}
+        """)
+        wine = {'type': 'uri',
+                'value': 'http://www.w3.org/TR/2003/PR-owl-guide-20031209/wine#Wine'}
+        result = sorted(r['label']['value']
+                        for r in query.select({'x': wine}))
+        self.assertEqual(result, ['vin', 'wine'])
+        self.assertEqual(len(list(query.iter_select({'x': wine}))), 2)
+        self.assertGreater(len(query.select()), 2)
+
+        ask = self.db.prepare("""
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        ASK { ?x rdfs:label ?label }
+        """)
+        self.assertTrue(ask.ask({'label': {'type': 'literal',
+                                           'value': 'Wine Ontology'}}))
+        self.assertFalse(ask.ask({'label': {'type': 'literal',
+                                            'value': 'FooBar'}}))
+
     def test_select_literal_language(self: ISPARQLEndpoint):
         q = """
         PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase, TestSuite, makeSuite, main
+
+import sparrow
+from sparrow.aio import AsyncTripleStore
+from sparrow.tests.base_tests import open_test_file
+
+GRAPES = """
+prefix vin: <http://www.w3.org/TR/2003/PR-owl-guide-20031209/wine#>
+select ?grape
+where { ?grape a vin:WineGrape .}
+"""
+
+
+class SlowStore(object):
+    max_concurrency = 4
+
+    def __init__(self):
+        self.threads = set()
+
+    def count(self, context=None):
+        self.threads.add(threading.get_ident())
+        time.sleep(0.2)
+        return 1
+
+
+class AsyncTripleStoreTest(TestCase):
+    def test_concurrent(self):
+        db = SlowStore()
+
+        async def run():
+            async with AsyncTripleStore(db) as store:
+                start = time.perf_counter()
+                counts = await asyncio.gather(*[store.count() for i in range(4)])
+                return counts, time.perf_counter() - start
+
+        counts, seconds = asyncio.run(run())
+        self.assertEqual(counts, [1] * 4)
+        self.assertLess(seconds, 0.6)
+        self.assertEqual(len(db.threads), 4)
+
+    def test_rdflib(self):
+        db = sparrow.database('rdflib', 'memory')
+
+        async def run():
+            async with AsyncTripleStore(db) as store:
+                with open_test_file('ntriples') as f:
+                    await store.add_ntriples(f, 'test')
+                results = await asyncio.gather(store.select(GRAPES),
+                                               store.ask(GRAPES.replace(
+                                                   'select ?grape', 'ask')),
+                                               store.get_ntriples('test'))
+                grapes = [b async for b in store.iter_select(GRAPES, batch_size=5)]
+                async with results[2] as stream:
+                    ntriples = await stream.read()
+                stream = await store.get_ntriples('test')
+                stream.chunk_size = 1024
+                chunks = [chunk async for chunk in stream]
+                await stream.close()
+                return results, grapes, ntriples, chunks
+
+        (select, ask, stream), grapes, ntriples, chunks = asyncio.run(run())
+        self.assertEqual(len(select), 16)
+        self.assertIs(ask, True)
+        self.assertIn('Wine Ontology', ntriples)
+        self.assertEqual(len(grapes), 16)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), ntriples)
+
+
+def test_suite():
+    suite = TestSuite()
+    suite.addTest(makeSuite(AsyncTripleStoreTest))
+    return suite
+
+
+if __name__ == '__main__':
+    main(defaultTest='test_suite')
@@ -0,0 +1,116 @@
+import time
+from unittest import TestCase, TestSuite, makeSuite, main
+
+import sparrow
+from sparrow.cache import CachedEndpoint, QueryCache
+from sparrow.tests.base_tests import open_test_file
+
+GRAPES = """
+prefix vin: <http://www.w3.org/TR/2003/PR-owl-guide-20031209/wine#>
+select ?grape
+where { ?grape a vin:WineGrape .}
+"""
+
+CONSTRUCT = """
+prefix vin: <http://www.w3.org/TR/2003/PR-owl-guide-20031209/wine#>
+construct { ?grape a vin:WineGrape .}
+where { ?grape a vin:WineGrape .}
+"""
+
+
+class QueryCacheTest(TestCase):
+    def test_lru(self):
+        cache = QueryCache(max_bytes=100)
+        cache.put('a', 1, 40)
+        cache.put('b', 2, 40)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3, 40)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.evictions),
+                         (2, 1, 1))
+        self.assertEqual((stats.entries, stats.bytes), (2, 80))
+
+    def test_too_large(self):
+        cache = QueryCache(max_bytes=100)
+        cache.put('a', 1, 101)
+        self.assertEqual(len(cache), 0)
+
+    def test_ttl(self):
+        cache = QueryCache(ttl=0.05)
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats().bytes, 0)
+
+
+class CachedEndpointTest(TestCase):
+    def setUp(self):
+        self.db = sparrow.database('rdflib', 'memory')
+        with open_test_file('ntriples') as f:
+            self.db.add_ntriples(f, 'test')
+        self.cached = CachedEndpoint(self.db)
+
+    def test_hits(self):
+        self.assertEqual(len(self.cached.select(GRAPES)), 16)
+        self.assertEqual(len(self.cached.select(GRAPES)), 16)
+        self.assertIs(self.cached.ask(GRAPES.replace('select ?grape', 'ask')),
+                      True)
+        stats = self.cached.stats()
+        self.assertEqual((stats.hits, stats.misses), (1, 2))
+
+    def test_construct(self):
+        first = self.cached.construct(CONSTRUCT, 'ntriples').read()
+        second = self.cached.construct(CONSTRUCT, 'ntriples').read()
+        self.assertEqual(first, second)
+        self.assertEqual(len([l for l in first.splitlines() if l]), 16)
+        data = self.cached.construct(CONSTRUCT, 'dict')
+        data.clear()
+        self.assertEqual(len(self.cached.construct(CONSTRUCT, 'dict')), 16)
+
+    def test_invalidation(self):
+        generation = self.db.generation
+        self.assertEqual(len(self.cached.select(GRAPES)), 16)
+        self.cached.remove_dict(
+            self.cached.construct(CONSTRUCT, 'dict'), 'test')
+        self.assertGreater(self.db.generation, generation)
+        self.assertEqual(self.cached.select(GRAPES), [])
+        self.db.clear('test')
+        self.assertEqual(self.cached.stats().hits, 0)
+
+    def test_copies(self):
+        rows = self.cached.select(GRAPES)
+        rows[0].clear()
+        del rows[1:]
+        self.assertEqual(len(self.cached.select(GRAPES)), 16)
+        self.assertTrue(all(self.cached.select(GRAPES)))
+
+    def test_shared_cache(self):
+        other = sparrow.database('rdflib', 'memory')
+        other.add_ntriples('<uri:a> <uri:b> <uri:c> .\n', 'test')
+        # the generations are the same, only the token tells them apart
+        self.assertEqual(other.generation, self.db.generation)
+        cache = QueryCache()
+        first = CachedEndpoint(self.db, cache)
+        second = CachedEndpoint(other, cache)
+        self.assertEqual(len(first.select(GRAPES)), 16)
+        self.assertEqual(second.select(GRAPES), [])
+        self.assertEqual(len(cache), 2)
+
+    def test_terms(self):
+        from sparrow.utils import TermDict
+        self.cached.select(GRAPES, terms=TermDict())
+        self.assertEqual(len(self.cached.cache), 0)
+
+
+def test_suite():
+    suite = TestSuite()
+    suite.addTest(makeSuite(QueryCacheTest))
+    suite.addTest(makeSuite(CachedEndpointTest))
+    return suite
+
+
+if __name__ == '__main__':
+    main(defaultTest='test_suite')
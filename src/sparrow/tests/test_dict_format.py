@@ -1,8 +1,24 @@
-from io import BytesIO
-from unittest import TestCase, TestSuite, makeSuite, main, mock
+import gzip
+import os
+import tempfile
+from io import BytesIO, StringIO
+from unittest import TestCase, TestSuite, makeSuite, main, mock, skipIf
 
+import simplejson
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from sparrow import ntriples, utils
+from sparrow.tests.base_tests import open_test_file
 from sparrow.tests.utils import to_tuple, ANY
-from sparrow.utils import ntriples_to_dict, dict_to_ntriples
+from sparrow.utils import (ntriples_to_dict, dict_to_ntriples,
+                           iter_ntriples, IterStream, Columns,
+                           iter_json_dict, json_to_ntriples, ntriples_to_json,
+                           parse_sparql_result, iter_sparql_result, TermDict,
+                           iter_sparql_json, iter_sparql_tsv,
+                           sparql_result_parser, XSD_NS)
 
 
 class DictFormatTest(TestCase):
@@ -92,10 +108,424 @@ class DictFormatTest(TestCase):
             data)
         self.assertEqual(nt, dict_to_ntriples(data).read())
 
+    def test_multiple_triples(self):
+        nt = (b'<uri:a> <uri:b> "x\\ty"@en .\n'
+              b'<uri:a> <uri:b> <uri:c> .\n'
+              b'<uri:a> <uri:d> "1"^^<uri:int> .\n'
+              b'<uri:e> <uri:b> <uri:c> .\n')
+        data = ntriples_to_dict(BytesIO(nt))
+        self.assertEqual(nt, dict_to_ntriples(data).read())
+        stream = dict_to_ntriples(data)
+        chunks = iter(lambda: stream.read(5), b'')
+        self.assertEqual(nt, b''.join(chunks))
+
+    def test_lazy_encoding(self):
+        data = {'uri:a%d' % i: {'uri:b': [{'value': 'uri:c', 'type': 'uri'}]}
+                for i in range(5000)}
+        batches = iter_ntriples(data, batch_size=1000)
+        self.assertEqual(next(batches).count(b'\n'), 1000)
+        self.assertEqual(len(list(batches)), 4)
+
+        def lines():
+            yield b'<uri:a> <uri:b> <uri:c> .\n'
+            raise AssertionError('read too far')
+        stream = IterStream(lines())
+        self.assertEqual(stream.read(7), b'<uri:a>')
+        stream.close()
+        self.assertTrue(stream.closed)
+
+    def test_parallel(self):
+        def uri_subjects(data):
+            # blank node ids are generated, ignore them
+            return to_tuple({
+                s: {p: [v if v['type'] != 'bnode' else {} for v in values]
+                    for p, values in predicates.items()}
+                for s, predicates in data.items() if not s.startswith('_:')})
+
+        with open_test_file('ntriples') as f:
+            expected = ntriples_to_dict(f)
+        with open_test_file('ntriples') as f:
+            data = ntriples_to_dict(f, parallel=3)
+        self.assertEqual(len(data), len(expected))
+        self.assertEqual(uri_subjects(data), uri_subjects(expected))
+        with open_test_file('ntriples') as f:
+            data = ntriples_to_dict(BytesIO(f.read()), parallel=4)
+        self.assertEqual(len(data), len(expected))
+
+    def test_parallel_stream(self):
+        nt = b''.join(b'<uri:a> <uri:b> "%d" .\n' % i for i in range(100))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.nt.gz')
+            with gzip.open(path, 'wb') as f:
+                f.write(nt)
+            with utils.open_file(path) as f:
+                data = ntriples_to_dict(f, parallel=2)
+            self.assertEqual(len(data['uri:a']['uri:b']), 100)
+
+            # a plain file that was partly read is parsed from there
+            path = os.path.join(tmp, 'data.nt')
+            with open(path, 'wb') as f:
+                f.write(b'<uri:c> <uri:b> "x" .\n' + nt)
+            with open(path, 'rb') as f:
+                f.readline()
+                data = ntriples_to_dict(f, parallel=2)
+            self.assertEqual(list(data), ['uri:a'])
+
+    def test_parallel_bnodes(self):
+        nt = b''.join(b'<uri:a> <uri:b> "%d" .\n' % i for i in range(100))
+        nt = b'_:x <uri:b> _:y .\n' + nt + b'_:y <uri:b> _:x .\n'
+        data = ntriples_to_dict(BytesIO(nt), parallel=2)
+        x, y = [s for s in data if s.startswith('_:')]
+        self.assertEqual(data[x]['uri:b'][0]['value'], y[2:])
+        self.assertEqual(data[y]['uri:b'][0]['value'], x[2:])
+        self.assertEqual(len(data['uri:a']['uri:b']), 100)
+
+
+class TermDictTest(TestCase):
+    def test_ids(self):
+        terms = TermDict()
+        self.assertEqual(terms.term_id('uri:a'), 0)
+        self.assertEqual(terms.term_id('uri:b'), 1)
+        self.assertEqual(terms.term_id('uri:a'), 0)
+        self.assertEqual(terms.term(1), 'uri:b')
+        self.assertEqual(len(terms), 2)
+        self.assertTrue('uri:a' in terms)
+
+    def test_ntriples_to_dict(self):
+        terms = TermDict()
+        nt = (b'<uri:a> <uri:b> <uri:c> .\n'
+              b'<uri:c> <uri:b> "1"^^<uri:int> .\n'
+              b'<uri:d> <uri:b> "2"^^<uri:int> .\n')
+        data = ntriples_to_dict(BytesIO(nt), terms=terms)
+        self.assertEqual(data, ntriples_to_dict(BytesIO(nt)))
+        (c, _), (d, _) = [(s, p) for s, p in data.items() if s != 'uri:a']
+        self.assertIs(data['uri:a']['uri:b'][0]['value'], c)
+        self.assertIs(data[c]['uri:b'][0]['datatype'],
+                      data[d]['uri:b'][0]['datatype'])
+        self.assertEqual(len(terms), 5)
+
+        parallel = ntriples_to_dict(BytesIO(nt), parallel=2, terms=terms)
+        self.assertEqual(parallel, data)
+        self.assertEqual(len(terms), 5)
+
+    def test_parse_sparql_result(self):
+        xml = b'''<?xml version="1.0"?>
+            <sparql xmlns="http://www.w3.org/2005/sparql-results#">
+              <head><variable name="x"/></head>
+              <results>
+                <result><binding name="x"><uri>uri:a</uri></binding></result>
+                <result><binding name="x"><uri>uri:a</uri></binding></result>
+              </results>
+            </sparql>'''
+        terms = TermDict()
+        first, second = parse_sparql_result(xml, terms)
+        self.assertEqual(first, {'x': {'type': 'uri', 'value': 'uri:a'}})
+        self.assertIs(first['x']['value'], second['x']['value'])
+
+
+class ColumnsTest(TestCase):
+    rows = [{'x': {'type': 'uri', 'value': 'uri:a'},
+             'y': {'type': 'literal', 'value': 'foo', 'lang': 'en'}},
+            {'x': {'type': 'bnode', 'value': 'b1'}},
+            {'x': {'type': 'uri', 'value': 'uri:a'},
+             'z': {'type': 'literal', 'value': '1', 'datatype': 'uri:int'}}]
+
+    def columns(self):
+        columns = Columns()
+        for row in self.rows:
+            columns.append(row)
+        return columns
+
+    def test_append(self):
+        columns = self.columns()
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(sorted(columns), ['x', 'y', 'z'])
+        self.assertEqual([columns.binding(i) for i in range(3)], self.rows)
+        self.assertEqual(columns.values('y'), ['foo', None, None])
+        x = columns['x']
+        self.assertEqual(x.values[0], x.values[2])
+        self.assertEqual(list(x.types), [utils.URI, utils.BNODE, utils.URI])
+        self.assertEqual(list(columns['z'].types), [0, 0, utils.LITERAL])
+
+    def test_append_terms(self):
+        nt = b'<uri:a> <uri:b> "1"^^<uri:int> .\n_:c <uri:b> "foo"@en .\n'
+        columns = Columns(('s', 'p', 'o'))
+        parser = ntriples.NTriplesParser(bnode_prefix='')
+        for triple in parser.iter_triples(BytesIO(nt)):
+            columns.append_terms(triple)
+        self.assertEqual(columns.binding(1),
+                         {'s': {'type': 'bnode', 'value': 'c'},
+                          'p': {'type': 'uri', 'value': 'uri:b'},
+                          'o': {'type': 'literal', 'value': 'foo', 'lang': 'en'}})
+        self.assertEqual(set(columns['p'].values), {columns.terms.term_id('uri:b')})
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_to_numpy(self):
+        arrays = self.columns()['x'].to_numpy()
+        self.assertEqual(int((arrays['types'] == utils.URI).sum()), 2)
+
+
+class JSONFormatTest(TestCase):
+    data = {'uri:a': {'uri:b': [{'value': 'caf\xe9 {"x": 1}', 'type': 'literal',
+                                 'lang': 'en'}]},
+            '_:c': {'uri:b': [{'value': 'uri:d', 'type': 'uri'},
+                              {'value': 'e', 'type': 'bnode'}]}}
+
+    def json(self, **kw):
+        return simplejson.dumps(self.data, **kw).encode('utf-8')
+
+    def test_iter_json_dict(self):
+        saved = ntriples.bufsiz
+        try:
+            for bufsiz in (1, 3, 7, 1024):
+                ntriples.bufsiz = bufsiz
+                for indent in (None, 2):
+                    pairs = iter_json_dict(BytesIO(self.json(indent=indent)))
+                    self.assertEqual(dict(pairs), self.data)
+        finally:
+            ntriples.bufsiz = saved
+        self.assertEqual(list(iter_json_dict(StringIO(' { } '))), [])
+
+    def test_reads_incrementally(self):
+        saved, ntriples.bufsiz = ntriples.bufsiz, 16
+        try:
+            f = BytesIO(self.json())
+            pairs = iter_json_dict(f)
+            next(pairs)
+            self.assertLess(f.tell(), len(f.getvalue()))
+        finally:
+            ntriples.bufsiz = saved
+
+    def test_json_to_ntriples(self):
+        nt = json_to_ntriples(BytesIO(self.json())).read()
+        self.assertEqual(nt, dict_to_ntriples(self.data).read())
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, json_to_ntriples, BytesIO(b'@'))
+        self.assertRaises(ValueError, json_to_ntriples, BytesIO(b'[]'))
+        for data in (b'{"uri:a": {}', b'{"uri:a": {} "uri:b": {}}',
+                     b'{"uri:a": {"uri:b": [}}', b'{1: {}}'):
+            self.assertRaises(ValueError, list, iter_json_dict(BytesIO(data)))
+
+
+    def test_ntriples_to_json(self):
+        nt = (b'<uri:a> <uri:b> "x"@en .\n'
+              b'<uri:a> <uri:c> <uri:d> .\n'
+              b'# comment\n'
+              b'<uri:d> <uri:b> "1"^^<uri:int> .\n')
+        data = ntriples_to_dict(BytesIO(nt))
+        for indent in (True, None, 2):
+            self.assertEqual(ntriples_to_json(BytesIO(nt), indent=indent).read(),
+                             simplejson.dumps(data, indent=indent))
+        self.assertEqual(ntriples_to_json(BytesIO(b'')).read(), '{}')
+
+    def test_ntriples_to_json_unsorted(self):
+        class Stream(BytesIO):
+            def seekable(self):
+                return False
+
+        nt = (b'<uri:a> <uri:b> _:x .\n'
+              b'_:x <uri:b> <uri:c> .\n'
+              b'<uri:c> <uri:b> "y" .\n'
+              b'<uri:a> <uri:b> "z" .\n')
+        expected = utils._ntriples_to_dict(BytesIO(nt), bnode_prefix='')
+        for f in (BytesIO(nt), Stream(nt)):
+            text = ntriples_to_json(f).read()
+            bnode = simplejson.loads(text)['uri:a']['uri:b'][0]['value']
+            data = simplejson.loads(text.replace(bnode, 'x'))
+            self.assertEqual(to_tuple(data), to_tuple(expected))
+
+    def test_spilled_buckets(self):
+        nt = b''.join(b'<uri:a%d> <uri:b> _:n%d .\n_:n%d <uri:b> "%d" .\n' %
+                      (i, i % 3, i % 3, i) for i in range(30))
+        subjects = dict(utils.iter_subjects(BytesIO(nt), buckets=4))
+        self.assertEqual(len(subjects), 33)
+        for i in range(30):
+            bnode = subjects['uri:a%d' % i]['uri:b'][0]['value']
+            self.assertEqual(len(subjects['_:' + bnode]['uri:b']), 10)
+
+
+class NQuadsTest(TestCase):
+    def test_iter_graphs(self):
+        nq = (b'<uri:a> <uri:b> "1" <context:x> .\n'
+              b'<uri:a> <uri:b> "2" <context:x> .\n'
+              b'<uri:a> <uri:b> "3" <uri:y> .\n'
+              b'<uri:a> <uri:b> "4" .\n'
+              b'<uri:a> <uri:b> "5" <context:x> .\n')
+        with mock.patch.object(ntriples, 'bufsiz', 1):
+            graphs = [(name, triples.read())
+                      for name, triples in utils.iter_graphs(BytesIO(nq))]
+        self.assertEqual(graphs, [
+            ('x', b'<uri:a> <uri:b> "1" .\n<uri:a> <uri:b> "2" .\n'),
+            ('uri:y', b'<uri:a> <uri:b> "3" .\n'),
+            (None, b'<uri:a> <uri:b> "4" .\n'),
+            ('x', b'<uri:a> <uri:b> "5" .\n')])
+        # statements that are not read are skipped
+        names = [name for name, triples in utils.iter_graphs(BytesIO(nq))]
+        self.assertEqual(names, ['x', 'uri:y', None, 'x'])
+        graphs = utils.nquads_to_ntriples(BytesIO(nq))
+        self.assertEqual(sorted(graphs, key=str), [None, 'uri:y', 'x'])
+        self.assertEqual(graphs['x'].read().count(b'\n'), 3)
+
+    def test_ntriples_to_nquads(self):
+        nt = (b'<uri:a> <uri:b> <uri:c> . # a comment\n'
+              b'# a line of comment\n'
+              b'<uri:a> <uri:b> "c . # d"@en .\n')
+        nq = ''.join(utils.ntriples_to_nquads(BytesIO(nt), 'g'))
+        self.assertEqual(nq, '<uri:a> <uri:b> <uri:c> <context:g> .\n'
+                             '<uri:a> <uri:b> "c . # d"@en <context:g> .\n')
+        quads = list(ntriples.iter_quads(BytesIO(nq.encode('utf-8'))))
+        self.assertEqual([quad[3] for quad in quads], ['context:g'] * 2)
+
+
+class CompressionTest(TestCase):
+    data = b'<uri:a> <uri:b> "c" .\n' * 1000
+
+    def test_roundtrip(self):
+        for compression in ('gzip', 'bz2', 'xz'):
+            compressed = utils.compress(BytesIO(self.data), compression).read()
+            self.assertLess(len(compressed), len(self.data))
+            self.assertEqual(utils.decompress(BytesIO(compressed)).read(),
+                             self.data)
+
+    def test_not_seekable(self):
+        class Stream(BytesIO):
+            seekable = None
+
+        compressed = utils.compress(StringIO(self.data.decode('utf-8')), 'gzip')
+        self.assertEqual(utils.decompress(compressed).read(), self.data)
+        self.assertEqual(utils.decompress(Stream(self.data)).read(), self.data)
+
+    def test_plain(self):
+        f = BytesIO(self.data)
+        self.assertIs(utils.decompress(f), f)
+        self.assertEqual(f.read(), self.data)
+        self.assertIs(utils.compress(f), f)
+        self.assertRaises(ValueError, utils.compress, f, 'zip')
+
+
+class SPARQLResultTest(TestCase):
+    def test_iter_sparql_result(self):
+        xml = (b'<?xml version="1.0"?>'
+               b'<sparql xmlns="http://www.w3.org/2005/sparql-results#">'
+               b'<head><variable name="x"/><variable name="y"/></head>'
+               b'<results>' +
+               b''.join(b'<result>'
+                        b'<binding name="x"><bnode>b%d</bnode></binding>'
+                        b'<binding name="y"><literal xml:lang="en">%d</literal>'
+                        b'</binding></result>' % (i, i) for i in range(3)) +
+               b'</results></sparql>')
+        results = iter_sparql_result(BytesIO(xml))
+        self.assertEqual(next(results),
+                         {'x': {'type': 'bnode', 'value': 'b0'},
+                          'y': {'type': 'literal', 'value': '0', 'lang': 'en'}})
+        self.assertEqual(len(list(results)), 2)
+        self.assertEqual(len(parse_sparql_result(xml)), 3)
+
+    def test_ask_result(self):
+        xml = (b'<?xml version="1.0"?>'
+               b'<sparql xmlns="http://www.w3.org/2005/sparql-results#">'
+               b'<head/><boolean>true</boolean></sparql>')
+        self.assertIs(parse_sparql_result(xml), True)
+        self.assertIs(parse_sparql_result(xml.replace(b'true', b'false')), False)
+
+    def test_formats_agree(self):
+        xml = ('<?xml version="1.0"?>'
+               '<sparql xmlns="http://www.w3.org/2005/sparql-results#">'
+               '<head><variable name="s"/><variable name="o"/></head><results>'
+               '<result><binding name="s"><uri>uri:a</uri></binding>'
+               '<binding name="o"><literal xml:lang="en">caf\xe9 "x"</literal>'
+               '</binding></result>'
+               '<result><binding name="s"><bnode>b1</bnode></binding>'
+               '<binding name="o"><literal datatype="%sinteger">12</literal>'
+               '</binding></result>'
+               '<result><binding name="s"><uri>uri:b</uri></binding></result>'
+               '</results></sparql>' % XSD_NS)
+        json = ('{"head": {"vars": ["s", "o"]}, "results": {"bindings": ['
+                '{"s": {"type": "uri", "value": "uri:a"}, "o": {"type": '
+                '"literal", "xml:lang": "en", "value": "caf\xe9 \\"x\\""}},'
+                '{"s": {"type": "bnode", "value": "b1"}, "o": {"type": '
+                '"typed-literal", "datatype": "%sinteger", "value": "12"}},'
+                '{"s": {"type": "uri", "value": "uri:b"}}]}}' % XSD_NS)
+        tsv = ('?s\t?o\n'
+               '<uri:a>\t"caf\\u00E9 \\"x\\""@en\n'
+               '_:b1\t12\n'
+               '<uri:b>\t\n')
+        expected = parse_sparql_result(xml.encode('utf-8'))
+        for mimetype, data in (('application/sparql-results+json', json),
+                               ('text/tab-separated-values', tsv)):
+            parse = sparql_result_parser(mimetype + '; charset=utf-8')
+            self.assertEqual(list(parse(BytesIO(data.encode('utf-8')))), expected)
+        self.assertIs(sparql_result_parser(None), iter_sparql_result)
+
+    def test_unbound_row(self):
+        xml = ('<?xml version="1.0"?>'
+               '<sparql xmlns="http://www.w3.org/2005/sparql-results#">'
+               '<head><variable name="x"/></head><results><result/>'
+               '<result><binding name="x"><uri>uri:a</uri></binding></result>'
+               '</results></sparql>')
+        expected = parse_sparql_result(xml.encode('utf-8'))
+        self.assertEqual(expected, [{}, {'x': {'type': 'uri',
+                                               'value': 'uri:a'}}])
+        self.assertEqual(list(iter_sparql_tsv('?x\n\n<uri:a>\n')), expected)
+        # with a CRLF split over two blocks
+        tsv = b'?x\r\n\r\n<uri:a>\r\n'
+        with mock.patch.object(ntriples, 'bufsiz', 3):
+            self.assertEqual(list(iter_sparql_tsv(tsv)), expected)
+
+    def test_tsv_shorthand(self):
+        tsv = '?x\n1.5\n-2e3\ntrue\n'
+        types = [row['x']['datatype'][len(XSD_NS):]
+                 for row in iter_sparql_tsv(tsv)]
+        self.assertEqual(types, ['decimal', 'double', 'boolean'])
+        self.assertRaises(ValueError, list, iter_sparql_tsv('?x\nfoo\n'))
+
+    def test_json_ask(self):
+        self.assertIs(next(iter_sparql_json('{"head": {}, "boolean": true}')), True)
+
+    def test_bind_values(self):
+        self.assertEqual(utils.bind_values('ASK {}', {}), 'ASK {}')
+        sparql = utils.bind_values('SELECT * { ?s ?p ?o }', {
+            's': {'type': 'uri', 'value': 'uri:a'},
+            'o': {'type': 'literal', 'value': 'a "b"', 'lang': 'en'}})
+        self.assertEqual(sparql, 'SELECT * { ?s ?p ?o\n'
+                                 'VALUES (?s ?o) { (<uri:a> "a \\"b\\""@en) }\n'
+                                 '}')
+        self.assertRaises(ValueError, utils.bind_values, 'ASK {}',
+                          {'s': {'type': 'bnode', 'value': 'b1'}})
+
+    def test_bind_values_where(self):
+        s = {'s': {'type': 'uri', 'value': 'uri:a'}}
+        values = '\nVALUES (?s) { (<uri:a>) }\n'
+        # bound before the grouping
+        self.assertEqual(
+            utils.bind_values('SELECT (COUNT(*) AS ?n) WHERE { ?s ?p ?o } '
+                              'GROUP BY ?p', s),
+            'SELECT (COUNT(*) AS ?n) WHERE { ?s ?p ?o' + values +
+            '} GROUP BY ?p')
+        # braces in the template, literals, comments and a VALUES clause
+        self.assertEqual(
+            utils.bind_values('CONSTRUCT { ?s ?p ?o } WHERE { ?s ?p "}" '
+                              '# }\n} VALUES ?p { <uri:p> }', s),
+            'CONSTRUCT { ?s ?p ?o } WHERE { ?s ?p "}" # }' + values +
+            '} VALUES ?p { <uri:p> }')
+        self.assertEqual(
+            utils.bind_values('ASK { { SELECT ?s { ?s ?p ?o } } '
+                              'FILTER(?s < <uri:b>) }', s),
+            'ASK { { SELECT ?s { ?s ?p ?o } } FILTER(?s < <uri:b>)' + values +
+            '}')
+        self.assertRaises(ValueError, utils.bind_values, 'DESCRIBE <uri:a>', s)
+
 
 def test_suite():
     suite = TestSuite()
     suite.addTest(makeSuite(DictFormatTest))
+    suite.addTest(makeSuite(TermDictTest))
+    suite.addTest(makeSuite(ColumnsTest))
+    suite.addTest(makeSuite(JSONFormatTest))
+    suite.addTest(makeSuite(NQuadsTest))
+    suite.addTest(makeSuite(CompressionTest))
+    suite.addTest(makeSuite(SPARQLResultTest))
     return suite
 
 
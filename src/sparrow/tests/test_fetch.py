@@ -0,0 +1,95 @@
+import gzip
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase, TestSuite, makeSuite, main
+
+import sparrow
+from sparrow import fetch
+from sparrow.error import ConnectionError
+from sparrow.tests.base_tests import open_test_file
+
+
+class Handler(BaseHTTPRequestHandler):
+    # keeps connections alive
+    protocol_version = 'HTTP/1.1'
+    etag = '"v1"'
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.client_address))
+        if self.path != '/wine.nt':
+            self.send_error(404)
+            return
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        with open_test_file('ntriples') as f:
+            body = f.read()
+        self.send_response(200)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchTest(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:%d/wine.nt' % self.server.server_port
+        self.cache_dir = tempfile.mkdtemp()
+        with open_test_file('ntriples') as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        fetch.get_session().close()
+        shutil.rmtree(self.cache_dir)
+
+    def test_fetch(self):
+        self.assertEqual(fetch.fetch(self.url).read(), self.data)
+        self.assertEqual(fetch.fetch(self.url).read(), self.data)
+        # the second request reuses the connection
+        (p1, client1), (p2, client2) = self.server.requests
+        self.assertEqual(client1, client2)
+
+    def test_cache(self):
+        for i in range(2):
+            with fetch.fetch(self.url, self.cache_dir) as f:
+                self.assertEqual(f.read(), self.data)
+        self.assertEqual(len(self.server.requests), 2)
+        Handler.etag = '"v2"'
+        try:
+            with fetch.fetch(self.url, self.cache_dir) as f:
+                self.assertEqual(f.read(), self.data)
+        finally:
+            Handler.etag = '"v1"'
+
+    def test_not_found(self):
+        self.assertRaises(ConnectionError, fetch.fetch, self.url + '.gz')
+
+    def test_add_uri(self):
+        db = sparrow.database('rdflib', 'memory')
+        db.add_ntriples(self.url, 'test')
+        self.assertIn('Wine Ontology', db.get_ntriples('test').read())
+
+
+def test_suite():
+    suite = TestSuite()
+    suite.addTest(makeSuite(FetchTest))
+    return suite
+
+
+if __name__ == '__main__':
+    main(defaultTest='test_suite')
@@ -0,0 +1,72 @@
+from io import BytesIO
+from unittest import TestCase, TestSuite, makeSuite, main
+
+from sparrow.graph import DictGraph, value_key
+from sparrow.tests.base_tests import open_test_file
+
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+WINE = 'http://www.w3.org/TR/2003/PR-owl-guide-20031209/wine#'
+GRAPE = {'type': 'uri', 'value': WINE + 'WineGrape'}
+
+
+class DictGraphTest(TestCase):
+    def setUp(self):
+        with open_test_file('ntriples') as f:
+            self.graph = DictGraph.from_ntriples(f)
+
+    def test_lookup(self):
+        grapes = self.graph.subjects(RDF_TYPE, GRAPE)
+        self.assertEqual(len(grapes), 16)
+        self.assertIn(WINE + 'MerlotGrape', grapes)
+        self.assertTrue(grapes < self.graph.subjects(value=GRAPE))
+        self.assertEqual(len(list(self.graph.triples(None, RDF_TYPE, GRAPE))), 16)
+        typed = self.graph.subjects(RDF_TYPE)
+        self.assertTrue(grapes < typed)
+        self.assertIn((WINE + 'MerlotGrape', RDF_TYPE, GRAPE), self.graph)
+        self.assertNotIn((WINE + 'MerlotGrape', RDF_TYPE, None), DictGraph())
+
+    def test_matches_scan(self):
+        scan = [(s, p, v) for s, predicates in self.graph.data.items()
+                for p, values in predicates.items() for v in values]
+        self.assertEqual(len(self.graph), len(scan))
+        self.assertEqual(len(list(self.graph.triples())), len(scan))
+        def key(triple):
+            s, p, v = triple
+            return s, p, value_key(v)
+
+        s, p, v = scan[100]
+        self.assertEqual(sorted(map(key, [t for t in scan if t[1:] == (p, v)])),
+                         sorted(map(key, self.graph.triples(None, p, v))))
+
+    def test_add_remove(self):
+        graph = self.graph
+        graph.subjects(RDF_TYPE, GRAPE)  # builds the indexes
+        graph.add('uri:a', RDF_TYPE, GRAPE)
+        graph.add('uri:a', RDF_TYPE, dict(GRAPE))
+        self.assertEqual(graph.values('uri:a', RDF_TYPE), [GRAPE])
+        self.assertEqual(len(graph.subjects(RDF_TYPE, GRAPE)), 17)
+        self.assertIn('uri:a', graph.subjects(RDF_TYPE))
+
+        graph.remove('uri:a')
+        self.assertNotIn('uri:a', graph.data)
+        self.assertNotIn('uri:a', graph.subjects(RDF_TYPE))
+        graph.remove(None, RDF_TYPE, GRAPE)
+        self.assertEqual(graph.subjects(RDF_TYPE, GRAPE), set())
+        self.assertEqual(graph.subjects(RDF_TYPE, GRAPE),
+                         DictGraph(graph.data).subjects(RDF_TYPE, GRAPE))
+
+    def test_literals(self):
+        graph = DictGraph.from_ntriples(BytesIO(
+            b'<uri:a> <uri:b> "x"@en .\n<uri:c> <uri:b> "x" .\n'))
+        self.assertEqual(graph.subjects(value={'type': 'literal', 'value': 'x'}),
+                         {'uri:c'})
+
+
+def test_suite():
+    suite = TestSuite()
+    suite.addTest(makeSuite(DictGraphTest))
+    return suite
+
+
+if __name__ == '__main__':
+    main(defaultTest='test_suite')
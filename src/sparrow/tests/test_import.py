@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase, TestSuite, makeSuite, main
+
+import sparrow
+
+SRC = os.path.dirname(os.path.dirname(sparrow.__file__))
+
+CHECK_MODULES = """
+import sys
+%s
+print(' '.join(m for m in ('rdflib', 'requests', 'lxml', 'zope.interface',
+                           'RDF', 'simplejson') if m in sys.modules))
+"""
+
+
+def imported_modules(code):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHECK_MODULES % code], env=env)
+    return output.decode('ascii').split()
+
+
+class LazyImportTest(TestCase):
+    def test_import_sparrow(self):
+        self.assertEqual(imported_modules('import sparrow'), [])
+
+    def test_import_ntriples(self):
+        self.assertEqual(imported_modules('import sparrow.ntriples'), [])
+
+    def test_database(self):
+        modules = imported_modules(
+            'import sparrow; sparrow.database("rdflib", "memory")')
+        self.assertTrue('rdflib' in modules)
+        self.assertFalse('requests' in modules)
+        self.assertFalse('RDF' in modules)
+
+    def test_exports(self):
+        from sparrow import RDFLibTripleStore
+        self.assertIsInstance(sparrow.database('rdflib', 'memory'),
+                              RDFLibTripleStore)
+
+    def test_register_backend(self):
+        sparrow.register_backend(
+            'memory', 'sparrow.rdflib_backend:RDFLibTripleStore')
+        self.addCleanup(sparrow._backends.pop, 'memory')
+        self.assertIs(sparrow.get_backend('memory'),
+                      sparrow.get_backend('rdflib'))
+        self.assertRaises(ValueError, sparrow.get_backend, 'foo')
+
+
+def test_suite():
+    suite = TestSuite()
+    suite.addTest(makeSuite(LazyImportTest))
+    return suite
+
+
+if __name__ == '__main__':
+    main(defaultTest='test_suite')
@@ -0,0 +1,98 @@
+import logging
+from unittest import TestCase, TestSuite, makeSuite, main
+
+import sparrow
+from sparrow import instrument
+from sparrow.error import QueryError
+from sparrow.instrument import Histogram, LoggingListener
+from sparrow.tests.base_tests import open_test_file
+
+
+class Recorder(object):
+    def __init__(self):
+        self.started = []
+        self.events = []
+
+    def start(self, event):
+        self.started.append(event.operation)
+
+    def stop(self, event):
+        self.events.append(event)
+
+
+class InstrumentTest(TestCase):
+    def setUp(self):
+        self.recorder = Recorder()
+        instrument.add_listener(self.recorder)
+        self.db = sparrow.database('rdflib', 'memory')
+        with open_test_file('ntriples') as f:
+            self.db.add_ntriples(f, 'test')
+
+    def tearDown(self):
+        instrument.remove_listener(self.recorder)
+
+    def test_backend_events(self):
+        self.db.get_dict('test')
+        operations = [e.operation for e in self.recorder.events]
+        self.assertEqual(operations, ['connect', 'add_ntriples',
+                                      'get_ntriples',
+                                      'utils.ntriples_to_dict', 'get_dict'])
+        self.assertEqual(self.recorder.started[-3:],
+                         ['get_dict', 'get_ntriples',
+                          'utils.ntriples_to_dict'])
+        get_ntriples, parse, get_dict = self.recorder.events[-3:]
+        self.assertEqual((get_dict.backend, get_dict.context),
+                         ('RDFLibTripleStore', 'test'))
+        self.assertIs(parse.parent, get_dict)
+        self.assertEqual(parse.triples, self.db.count('test'))
+        self.assertGreater(get_dict.seconds, parse.seconds)
+
+    def test_rows_and_errors(self):
+        self.db.select('select ?s where { ?s ?p ?o } limit 3')
+        self.assertEqual(self.recorder.events[-1].rows, 3)
+        self.assertRaises(QueryError, self.db.ask, 'foo')
+        self.assertIsInstance(self.recorder.events[-1].error,
+                              QueryError)
+
+    def test_disabled(self):
+        instrument.remove_listener(self.recorder)
+        self.assertFalse(instrument.enabled())
+        self.db.count()
+        self.assertEqual(len(self.recorder.events), 2)
+
+    def test_histogram(self):
+        histogram = Histogram()
+        instrument.add_listener(histogram)
+        try:
+            for i in range(10):
+                self.db.get_columns('test')
+        finally:
+            instrument.remove_listener(histogram)
+        stats = histogram.summary()['get_columns']
+        self.assertEqual(stats['count'], 10)
+        self.assertEqual(stats['triples'], 10 * self.db.count('test'))
+        self.assertLessEqual(stats['p50'], stats['p99'])
+        self.assertLessEqual(stats['p99'], stats['max'])
+        self.assertGreater(stats['mean'], 0)
+
+    def test_logging(self):
+        listener = LoggingListener()
+        instrument.add_listener(listener)
+        try:
+            with self.assertLogs('sparrow.instrument', logging.DEBUG) as logs:
+                self.db.count('test')
+        finally:
+            instrument.remove_listener(listener)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('RDFLibTripleStore.count', logs.output[0])
+        self.assertIn('context=test', logs.output[0])
+
+
+def test_suite():
+    suite = TestSuite()
+    suite.addTest(makeSuite(InstrumentTest))
+    return suite
+
+
+if __name__ == '__main__':
+    main(defaultTest='test_suite')
@@ -0,0 +1,147 @@
+"""Peak memory of the conversions, measured with tracemalloc.
+
+The streaming conversions must use the same memory for any input size.
+The N-Triples block size is made small, so the inputs can be small too.
+"""
+import tracemalloc
+from io import BytesIO
+from unittest import TestCase, TestSuite, makeSuite, main, mock
+
+import sparrow
+from sparrow import ntriples, utils
+from sparrow.tests.base_tests import open_test_file
+
+
+def peak(function):
+    """Returns the peak of memory allocated while function runs"""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def drain(file):
+    while file.read(4096):
+        pass
+
+
+def consume(iterable):
+    for item in iterable:
+        pass
+
+
+def wine(copies):
+    """Returns copies of the wine triples, without blank nodes.
+
+    Blank node labels are remembered while parsing, a parser can only run
+    in constant memory when their number is bounded.
+    """
+    with open_test_file('ntriples') as f:
+        data = b''.join(line for line in f if b'_:' not in line)
+    return b''.join(data.replace(b'wine#', b'wine-%d#' % copy)
+                    for copy in range(copies))
+
+
+def sparql_tsv(rows):
+    lines = ['?s\t?label\n']
+    for i in range(rows):
+        lines.append('<http://example.org/wine/%d>\t"Wine %d"@en\n' % (i, i))
+    return ''.join(lines).encode('utf-8')
+
+
+def sparql_xml(rows):
+    results = ''.join(
+        '<result><binding name="s"><uri>http://example.org/wine/%d</uri>'
+        '</binding><binding name="label"><literal xml:lang="en">Wine %d'
+        '</literal></binding></result>' % (i, i) for i in range(rows))
+    return ('<?xml version="1.0"?><sparql xmlns="%s"><head>'
+            '<variable name="s"/><variable name="label"/></head>'
+            '<results>%s</results></sparql>' % (utils.SPARQL_NS, results)
+            ).encode('utf-8')
+
+
+class MemoryTest(TestCase):
+    def setUp(self):
+        patch = mock.patch.object(ntriples, 'bufsiz', 16 * 1024)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def assertConstantPeak(self, prepare, small=4, large=16, growth=0):
+        """prepare(size) returns the conversion of an input of size, its
+        peak may grow by no more than ``growth`` bytes per unit of size
+        """
+        first = peak(prepare(small))
+        second = peak(prepare(large))
+        self.assertLess(second,
+                        first * 1.1 + 64 * 1024 + growth * (large - small),
+                        'peak grew from %d to %d bytes' % (first, second))
+
+    def test_iter_triples(self):
+        def prepare(copies):
+            data = BytesIO(wine(copies))
+            return lambda: consume(ntriples.iter_triples(data))
+        self.assertConstantPeak(prepare)
+
+    def test_ntriples_to_nquads(self):
+        def prepare(copies):
+            data = BytesIO(wine(copies))
+            return lambda: consume(utils.ntriples_to_nquads(data, 'wine'))
+        self.assertConstantPeak(prepare)
+
+    def test_ntriples_to_json(self):
+        def prepare(copies):
+            data = BytesIO(wine(copies))
+            return lambda: drain(utils.ntriples_to_json(data))
+        # checking that the subjects are grouped keeps a hash per subject
+        subjects = len(utils.ntriples_to_dict(BytesIO(wine(1))))
+        self.assertConstantPeak(prepare, growth=subjects * 100)
+
+    def test_json_to_ntriples(self):
+        def prepare(copies):
+            data = BytesIO(utils.ntriples_to_json(
+                BytesIO(wine(copies))).read().encode('utf-8'))
+            return lambda: drain(utils.json_to_ntriples(data))
+        self.assertConstantPeak(prepare)
+
+    def test_dict_to_ntriples(self):
+        def prepare(copies):
+            data = utils.ntriples_to_dict(BytesIO(wine(copies)))
+            return lambda: drain(utils.dict_to_ntriples(data))
+        self.assertConstantPeak(prepare)
+
+    def test_sparql_results(self):
+        for parse, make in ((utils.iter_sparql_result, sparql_xml),
+                            (utils.iter_sparql_tsv, sparql_tsv)):
+            def prepare(copies):
+                data = BytesIO(make(copies * 500))
+                return lambda: consume(parse(data))
+            self.assertConstantPeak(prepare)
+
+    def test_nquads(self):
+        def prepare(contexts):
+            db = sparrow.database('rdflib', 'memory')
+            for context in range(contexts):
+                db.add_ntriples(BytesIO(wine(1)), 'wine%d' % context)
+            return lambda: drain(db.get_nquads())
+        # the contexts are serialized one at a time
+        self.assertConstantPeak(prepare)
+
+    def test_columns(self):
+        db = sparrow.database('rdflib', 'memory')
+        db.add_ntriples(BytesIO(wine(4)), 'wine')
+        # the columns hold term ids, the dict format a dict per value
+        columns = peak(lambda: db.get_columns('wine'))
+        data = peak(lambda: db.get_dict('wine'))
+        self.assertLess(columns, data)
+
+
+def test_suite():
+    suite = TestSuite()
+    suite.addTest(makeSuite(MemoryTest))
+    return suite
+
+
+if __name__ == '__main__':
+    main(defaultTest='test_suite')
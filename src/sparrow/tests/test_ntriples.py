@@ -0,0 +1,217 @@
+from io import BytesIO, StringIO
+from unittest import TestCase, TestSuite, makeSuite, main
+
+from sparrow import ntriples
+from sparrow.ntriples import ParseError, unquote
+
+
+class UnquoteTest(TestCase):
+    def test_plain(self):
+        self.assertEqual(unquote('Hello world'), 'Hello world')
+
+    def test_escapes(self):
+        self.assertEqual(unquote('\\t\\b\\n\\r\\f\\"\\\'\\\\'),
+                         '\t\b\n\r\f"\'\\')
+
+    def test_unicode_escapes(self):
+        self.assertEqual(unquote('caf\\u00E9 \\U0001F377'), 'café \U0001f377')
+
+    def test_illegal_escape(self):
+        self.assertRaises(ParseError, unquote, 'foo\\x')
+        self.assertRaises(ParseError, unquote, 'foo\\')
+        self.assertRaises(ParseError, unquote, '\\U00110000')
+
+    def test_long_literal(self):
+        # used to exceed the recursion limit
+        value = 'a\\"b\\\\c\\nd' * 20000
+        self.assertEqual(unquote(value), 'a"b\\c\nd' * 20000)
+
+    def test_validating(self):
+        ntriples.validate = True
+        try:
+            self.assertEqual(unquote('a\\"b\\u00E9' * 5000), 'a"bé' * 5000)
+            self.assertRaises(ParseError, unquote, 'foo\\x')
+        finally:
+            ntriples.validate = False
+
+    def test_both_modes(self):
+        literals = {'caf\\u00e9': 'caf\u00e9', 'a\\bb': 'a\bb',
+                    "it\\'s": "it's", 'a\\"b\\\\c': 'a"b\\c',
+                    '\\U0001F377\\t': '\U0001f377\t'}
+        for mode in (False, True):
+            ntriples.validate = mode
+            try:
+                for literal, value in literals.items():
+                    self.assertEqual(unquote(literal), value)
+                self.assertRaises(ParseError, unquote, 'foo\\x')
+                self.assertRaises(ParseError, unquote, 'foo\\')
+            finally:
+                ntriples.validate = False
+        ntriples.validate = True
+        try:
+            # only printable ASCII is allowed unescaped
+            self.assertRaises(ParseError, unquote, 'caf\u00e9')
+            self.assertRaises(ParseError, unquote, 'a"b')
+        finally:
+            ntriples.validate = False
+
+    def test_parse_long_literal(self):
+        value = '{\\"abstract\\": \\"%s\\"}' % ('x' * 100000)
+        nt = '<uri:a> <uri:b> "%s" .\n' % value
+
+        class Sink(object):
+            def triple(self, s, p, o):
+                self.value = o.value
+
+        sink = ntriples.NTriplesParser(Sink()).parse(BytesIO(nt.encode('utf-8')))
+        self.assertEqual(sink.value, '{"abstract": "%s"}' % ('x' * 100000))
+
+
+class ReadlinesTest(TestCase):
+    def lines(self, data, bufsiz=ntriples.bufsiz):
+        saved, ntriples.bufsiz = ntriples.bufsiz, bufsiz
+        try:
+            return [l for l in ntriples.readlines(BytesIO(data)) if l]
+        finally:
+            ntriples.bufsiz = saved
+
+    def test_line_endings(self):
+        self.assertEqual(self.lines(b'a\nb\r\nc\rd\n'), ['a', 'b', 'c', 'd'])
+
+    def test_unterminated_last_line(self):
+        self.assertEqual(self.lines(b'a\nb'), ['a', 'b'])
+
+    def test_small_blocks(self):
+        data = b'<uri:a>\r\n<uri:b>\r<uri:c>\ncaf\xc3\xa9\r\n'
+        for bufsiz in range(1, 8):
+            self.assertEqual(self.lines(data, bufsiz),
+                             ['<uri:a>', '<uri:b>', '<uri:c>', 'caf\xe9'])
+
+    def test_split_crlf(self):
+        data = b'a\r\n\r\nb\r\n'
+        for bufsiz in range(1, 8):
+            saved, ntriples.bufsiz = ntriples.bufsiz, bufsiz
+            try:
+                lines = list(ntriples.readlines(BytesIO(data)))
+            finally:
+                ntriples.bufsiz = saved
+            self.assertEqual(lines, ['a', '', 'b'])
+
+    def test_text_input(self):
+        self.assertEqual(list(ntriples.readlines(StringIO('a\nb\n'))), ['a', 'b'])
+
+
+class IterTriplesTest(TestCase):
+    def test_iter_triples(self):
+        nt = (b'# comment\n'
+              b'<uri:a> <uri:b> "foo"@en .\n'
+              b'\n'
+              b'<uri:a> <uri:c> <uri:d> .\n')
+        triples = ntriples.iter_triples(BytesIO(nt))
+        s, p, o = next(triples)
+        self.assertEqual((s, p, o), ('uri:a', 'uri:b', ('foo', 'en', None)))
+        self.assertIsInstance(s, ntriples.URI)
+        self.assertEqual(o.language, 'en')
+        s, p, o = next(triples)
+        self.assertEqual((s, p, o), ('uri:a', 'uri:c', 'uri:d'))
+        self.assertRaises(StopIteration, next, triples)
+
+    def test_to_rdflib(self):
+        import rdflib
+        nt = b'<uri:a> <uri:b> "1"^^<uri:int> .\n_:x <uri:b> "foo"@en .\n'
+        triples = [tuple(ntriples.to_rdflib(t) for t in triple)
+                   for triple in ntriples.iter_triples(BytesIO(nt))]
+        self.assertEqual(triples[0], (rdflib.URIRef('uri:a'), rdflib.URIRef('uri:b'),
+                                      rdflib.Literal('1', datatype=rdflib.URIRef('uri:int'))))
+        self.assertIsInstance(triples[1][0], rdflib.BNode)
+        self.assertEqual(triples[1][2], rdflib.Literal('foo', 'en'))
+
+    def test_iter_quads(self):
+        nq = (b'<uri:a> <uri:b> "foo"@en <uri:g> .\n'
+              b'<uri:a> <uri:b> _:c _:g .\n'
+              b'<uri:a> <uri:b> <uri:c> .\n')
+        quads = list(ntriples.iter_quads(BytesIO(nq)))
+        self.assertEqual(quads[0], ('uri:a', 'uri:b', ('foo', 'en', None), 'uri:g'))
+        self.assertIsInstance(quads[1][3], ntriples.BNode)
+        self.assertEqual(quads[2], ('uri:a', 'uri:b', 'uri:c', None))
+
+    def test_serialize(self):
+        nt = (b'<uri:a> <uri:b> "a \\"b\\"\\n"@en .\n'
+              b'<uri:a> <uri:b> "1"^^<uri:int> .\n'
+              b'<uri:a> <uri:b> _:c .\n')
+        parser = ntriples.NTriplesParser(bnode_prefix='')
+        lines = [' '.join(ntriples.serialize(t) for t in triple) + ' .\n'
+                 for triple in parser.iter_triples(BytesIO(nt))]
+        self.assertEqual(''.join(lines).encode('utf-8'), nt)
+
+    def test_invalid_line(self):
+        triples = ntriples.iter_triples(BytesIO(b'<uri:a> <uri:b> .\n'))
+        self.assertRaises(ParseError, list, triples)
+
+
+class ParallelTest(TestCase):
+    def test_split(self):
+        data = b'a\r\nbb\rccc\ndddd'
+        for parts in range(1, 10):
+            ranges = ntriples.split(data, parts)
+            self.assertEqual(b''.join(data[s:e] for s, e in ranges), data)
+            for start, end in ranges[:-1]:
+                self.assertIn(data[end - 1:end], (b'\r', b'\n'))
+                self.assertNotEqual(data[end:end + 1], b'\n')
+
+    def test_parse_parallel(self):
+        nt = b''.join(b'<uri:a> <uri:b> "%d" .\n' % i for i in range(50))
+        triples = ntriples.parse_parallel(nt + b'_:x <uri:b> _:x .', workers=3)
+        self.assertEqual([o.value for s, p, o in triples[:-1]],
+                         [str(i) for i in range(50)])
+        s, p, o = triples[-1]
+        self.assertEqual(s, o)
+
+
+class BNodeTest(TestCase):
+    nt = b'_:a <uri:b> _:a .\n'
+
+    def subject(self, parser):
+        return next(parser.iter_triples(BytesIO(self.nt)))[0]
+
+    def test_scoped_per_parse(self):
+        parser = ntriples.NTriplesParser()
+        s, p, o = next(parser.iter_triples(BytesIO(self.nt)))
+        self.assertEqual(s, o)
+        self.assertNotEqual(self.subject(parser), self.subject(parser))
+        self.assertNotEqual(self.subject(parser),
+                            self.subject(ntriples.NTriplesParser()))
+
+    def test_mapping_released(self):
+        parser = ntriples.NTriplesParser()
+        list(parser.iter_triples(BytesIO(self.nt)))
+        self.assertEqual(parser._bnode_ids, {})
+
+    def test_session(self):
+        parser = ntriples.NTriplesParser()
+        with parser.session():
+            self.assertEqual(self.subject(parser), self.subject(parser))
+            self.assertEqual(len(parser._bnode_ids), 1)
+        self.assertEqual(parser._bnode_ids, {})
+        self.assertNotEqual(self.subject(parser), self.subject(parser))
+
+    def test_keep_labels(self):
+        parser = ntriples.NTriplesParser(bnode_prefix='')
+        self.assertEqual(str(self.subject(parser)), 'a')
+        self.assertEqual(parser._bnode_ids, {})
+        parser = ntriples.NTriplesParser(bnode_prefix='doc1-')
+        self.assertEqual(str(self.subject(parser)), 'doc1-a')
+
+
+def test_suite():
+    suite = TestSuite()
+    suite.addTest(makeSuite(UnquoteTest))
+    suite.addTest(makeSuite(ReadlinesTest))
+    suite.addTest(makeSuite(IterTriplesTest))
+    suite.addTest(makeSuite(ParallelTest))
+    suite.addTest(makeSuite(BNodeTest))
+    return suite
+
+
+if __name__ == '__main__':
+    main(defaultTest='test_suite')
@@ -3,6 +3,7 @@ from __future__ import print_function
 from unittest import TestSuite, main, TestLoader
 
 import sparrow
+from sparrow import utils
 from sparrow.error import ConnectionError
 from sparrow.tests.base_tests import (TripleStoreTest,
                                       TripleStoreQueryTest,
@@ -32,6 +33,24 @@ class RDFLibQueryTest(TripleStoreQueryTest):
         self.db.disconnect()
         del self.db
 
+    def test_select_ask(self):
+        q = """
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        ASK { ?x rdfs:label "Wine Ontology"}
+        """
+        self.assertIs(self.db.select(q), True)
+
+    def test_bind_values_aggregate(self):
+        # the VALUES fallback of other backends binds like initBindings
+        q = 'select (count(*) as ?n) where { ?s ?p ?o }'
+        wine = {'s': {'type': 'uri', 'value':
+                      'http://www.w3.org/TR/2003/PR-owl-guide-20031209/wine#Wine'}}
+        native = self.db.prepare(q).select(wine)
+        values = self.db.select(utils.bind_values(q, wine))
+        self.assertEqual(values, native)
+        self.assertLess(int(values[0]['n']['value']),
+                        int(self.db.select(q)[0]['n']['value']))
+
 
 # See: http://codereview.stackexchange.com/q/88655/15346
 def make_suite(*tc_classes):
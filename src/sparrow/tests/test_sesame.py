@@ -1,8 +1,11 @@
 import os
-from unittest import TestSuite, makeSuite, main
+import threading
+from unittest import TestCase, TestSuite, makeSuite, main, mock
 
 import sparrow
+from sparrow import utils
 from sparrow.error import ConnectionError
+from sparrow.sesame_backend import SesameTripleStore
 from sparrow.tests.base_tests import (TripleStoreTest,
                                       TripleStoreQueryTest,
                                       open_test_file)
@@ -40,6 +43,68 @@ class SesameQueryTest(TripleStoreQueryTest):
         self.db.disconnect()
         del self.db
 
+    def test_select_ask(self):
+        q = """
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        ASK { ?x rdfs:label "Wine Ontology"}
+        """
+        self.assertIs(self.db.select(q), True)
+
+
+class SessionTest(TestCase):
+    def test_session_per_thread(self):
+        db = SesameTripleStore()
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(db._session))
+        thread.start()
+        thread.join()
+        self.assertIs(db._session, db._session)
+        self.assertIsNot(db._session, sessions[0])
+        db.disconnect()
+        self.assertEqual(db._sessions, [])
+        self.assertIsNot(db._session, sessions[0])
+
+    def test_get_nquads_stream(self):
+        lines = ['<uri:a> <uri:b> "%d" <context:a> .\n' % i
+                 for i in range(100)]
+
+        class Response(object):
+            status_code = 200
+            raw = mock.Mock()
+            pulled = 0
+            closed = False
+
+            def iter_content(self, chunk_size):
+                for line in lines:
+                    Response.pulled += 1
+                    yield line.encode('utf-8')
+
+            def close(self):
+                Response.closed = True
+
+        db = SesameTripleStore()
+        db._local.session = mock.Mock()
+        db._local.session.get.return_value = Response()
+        result = db.get_nquads()
+        first = result.read(10)
+        self.assertEqual(first, lines[0][:10])
+        self.assertLess(Response.pulled, len(lines))
+        self.assertTrue(db._local.session.get.call_args[1]['stream'])
+        chunks = [first]
+        while True:
+            chunk = result.read(100)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.assertEqual(''.join(chunks), ''.join(lines))
+        self.assertTrue(Response.closed)
+
+        Response.closed = False
+        compressed = db.get_nquads(compression='gzip')
+        data = utils.decompress(compressed).read()
+        self.assertEqual(data, ''.join(lines).encode('utf-8'))
+        self.assertTrue(Response.closed)
+
 
 def get_sesame_url():
     # host and port variables are set from
@@ -50,13 +115,14 @@ def get_sesame_url():
 
 
 def test_suite():
+    suite = TestSuite()
+    suite.addTest(makeSuite(SessionTest))
     try:
         sparrow.database('sesame', get_sesame_url())
     except ConnectionError:
         # sesame not running?
-        return TestSuite()
+        return suite
 
-    suite = TestSuite()
     suite.addTest(makeSuite(SesameTest))
     suite.addTest(makeSuite(SesameQueryTest))
     return suite
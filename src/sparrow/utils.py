@@ -1,161 +1,1050 @@
-from io import BytesIO, StringIO
+import bz2
+import codecs
+import gzip
+import lzma
+import os
+import re
+from array import array
+from itertools import chain
+import zlib
+from io import (BufferedReader, BytesIO, FileIO, RawIOBase, StringIO,
+                TextIOBase, TextIOWrapper)
+from tempfile import TemporaryFile
+from uuid import uuid4
 
 import simplejson
 from lxml import etree
 
-from sparrow import ntriples
+from sparrow import instrument, ntriples
+from sparrow.instrument import instrumented
 
 SPARQL_NS = u'http://www.w3.org/2005/sparql-results#'
+XSD_NS = u'http://www.w3.org/2001/XMLSchema#'
 
-def parse_sparql_result(xml):
-    doc = etree.fromstring(xml)
+
+class TermDict(object):
+    """A dictionary encoding of terms (URIs, blank node ids, languages...)
+
+    Every distinct term gets an integer id. Parsers and converters that
+    are given a TermDict store the shared copy of each term they meet,
+    so repeated URIs take up memory only once, and the ids can be
+    compared instead of the strings.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._terms = []
+
+    def __len__(self):
+        return len(self._terms)
+
+    def __contains__(self, term):
+        return term in self._ids
+
+    def intern(self, term):
+        """Returns the shared copy of term, adding it if it is new"""
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term = str(term)
+            self._ids[term] = len(self._terms)
+            self._terms.append(term)
+            return term
+        return self._terms[term_id]
+
+    def term_id(self, term):
+        """Returns the id of term, adding it if it is new"""
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term_id = self._ids[str(term)] = len(self._terms)
+            self._terms.append(str(term))
+        return term_id
+
+    def term(self, term_id):
+        """Returns the term with the given id"""
+        return self._terms[term_id]
+
+
+# type codes of the terms in a Column
+UNBOUND, URI, BNODE, LITERAL = 0, 1, 2, 3
+TYPE_CODES = {'uri': URI, 'bnode': BNODE, 'literal': LITERAL}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+
+class Column(object):
+    """The values of one variable, as arrays of term ids.
+
+    ``values`` holds the id of each value in a TermDict and ``types`` its
+    type code. ``langs`` and ``datatypes`` hold the ids of the language
+    and datatype of literals. Missing values and annotations are -1.
+    """
+
+    __slots__ = ('values', 'types', 'langs', 'datatypes')
+
+    def __init__(self):
+        self.values = array('i')
+        self.types = array('b')
+        self.langs = array('i')
+        self.datatypes = array('i')
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value, terms):
+        """Append a value dict, as in select results, or None"""
+        if value is None:
+            self.append_ids(-1, UNBOUND)
+            return
+        lang = value.get('lang')
+        datatype = value.get('datatype')
+        self.append_ids(terms.term_id(value['value']),
+                        TYPE_CODES[value['type']],
+                        -1 if lang is None else terms.term_id(lang),
+                        -1 if datatype is None else terms.term_id(datatype))
+
+    def append_term(self, term, terms):
+        """Append a term of the N-Triples parser"""
+        if isinstance(term, ntriples.Literal):
+            self.append_ids(
+                terms.term_id(term.value), LITERAL,
+                -1 if term.language is None else terms.term_id(term.language),
+                -1 if term.datatype is None else terms.term_id(term.datatype))
+        elif isinstance(term, ntriples.BNode):
+            self.append_ids(terms.term_id(term), BNODE)
+        else:
+            self.append_ids(terms.term_id(term), URI)
+
+    def append_ids(self, value, type, lang=-1, datatype=-1):
+        self.values.append(value)
+        self.types.append(type)
+        self.langs.append(lang)
+        self.datatypes.append(datatype)
+
+    def to_numpy(self):
+        """Returns a dict of NumPy arrays sharing memory with the column.
+
+        The column can not grow while the NumPy arrays exist.
+        """
+        import numpy
+        return {name: numpy.frombuffer(getattr(self, name),
+                                       dtype=getattr(self, name).typecode)
+                for name in self.__slots__}
+
+
+class Columns(object):
+    """Rows of bindings stored as a Column per variable.
+
+    All columns share one TermDict, ``terms``, so equal terms have equal
+    ids across the columns.
+    """
+
+    def __init__(self, names=(), terms=None):
+        self.terms = TermDict() if terms is None else terms
+        self.columns = {name: Column() for name in names}
+        self._rows = 0
+
+    def __len__(self):
+        return self._rows
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def _column(self, name):
+        column = self.columns.get(name)
+        if column is None:
+            # the variable was unbound in the previous rows
+            column = self.columns[name] = Column()
+            for row in range(self._rows):
+                column.append_ids(-1, UNBOUND)
+        return column
+
+    def append(self, binding):
+        """Append a row of bindings as returned by select"""
+        for name in binding:
+            if name not in self.columns:
+                self._column(name)
+        terms = self.terms
+        for name, column in self.columns.items():
+            column.append(binding.get(name), terms)
+        self._rows += 1
+
+    def append_terms(self, row):
+        """Append a row of N-Triples parser terms, one per column"""
+        terms = self.terms
+        for column, term in zip(self.columns.values(), row):
+            column.append_term(term, terms)
+        self._rows += 1
+
+    def values(self, name):
+        """Returns the values of a column as strings, None if unbound"""
+        term = self.terms.term
+        return [None if i < 0 else term(i) for i in self.columns[name].values]
+
+    def binding(self, row):
+        """Returns a row as the bindings dict returned by select"""
+        term = self.terms.term
+        result = {}
+        for name, column in self.columns.items():
+            type = column.types[row]
+            if type == UNBOUND:
+                continue
+            value = {'value': term(column.values[row]),
+                     'type': TYPE_NAMES[type]}
+            if column.langs[row] >= 0:
+                value['lang'] = term(column.langs[row])
+            if column.datatypes[row] >= 0:
+                value['datatype'] = term(column.datatypes[row])
+            result[name] = value
+        return result
+
+
+def intern_value(value, terms):
+    """Intern the terms of a value dict in place"""
+    if value['type'] != 'literal':
+        value['value'] = terms.intern(value['value'])
+    if 'lang' in value:
+        value['lang'] = terms.intern(value['lang'])
+    if 'datatype' in value:
+        value['datatype'] = terms.intern(value['datatype'])
+    return value
+
+
+def intern_dict(data, terms):
+    """Returns data, in the dict format, with all terms interned"""
+    intern = terms.intern
+    return {intern(subject): {intern(predicate): [intern_value(v, terms)
+                                                  for v in values]
+                              for predicate, values in predicates.items()}
+            for subject, predicates in data.items()}
+
+
+@instrumented('utils.parse_sparql_result')
+def parse_sparql_result(xml, terms=None):
+    """Parse a SPARQL XML result document.
+
+    Returns a list of bindings, or a boolean for an ASK query result.
+    Terms are interned in the ``terms`` TermDict, if given.
+    """
     results = []
-    for result in doc.xpath('/s:sparql/s:results/s:result', namespaces={'s': SPARQL_NS}):
-        data = {}
-        for binding in result:
-            name = binding.attrib['name']
-            for value in binding:
-                type = value.tag.split('}')[-1]
-                lang = value.attrib.get('{http://www.w3.org/XML/1998/namespace}lang')
-                datatype = value.attrib.get('datatype')
-                text = value.text
-                if text is not None and not isinstance(text, str):
-                    text = text.decode('utf8')
+    for result in iter_sparql_result(xml, terms):
+        if isinstance(result, bool):
+            # this is an ASK query response
+            return result
+        results.append(result)
+    instrument.record(rows=len(results))
+    return results
 
-                if type == 'uri':
-                    # allegro graph returns context uri's with <> chars
-                    if text.startswith('<'):
-                        text = text[1:]
-                    if text.endswith('>'):
-                        text = text[:-1]
-
-                data[name] = {'value': text,
-                              'type': type}
-                if not lang is None:
-                    # w3c sparql json result spec says 'xml:lang',
-                    # we use 'lang' instead, just like the dict serialization
-                    # data[name]['lang'] = lang.decode('utf8')
-                    data[name]['lang'] = lang
-                if not datatype is None:
-                    # data[name]['datatype'] = datatype.decode('utf8')
-                    data[name]['datatype'] = datatype
-                    # w3c sparql json result spec says 'type' should not be
-                    # 'literal', but 'typed-literal', we don't do this
-
-                    # data[name]['type'] = 'typed-literal'
-
-        results.append(data)
-    if not results:
-        # maybe this is an ASK query response
-        bools = doc.xpath('/s:sparql/s:boolean/text()',
-                          namespaces={'s': SPARQL_NS})
-        if bools:
-            if bools[0] == 'true':
-                return True
+
+def iter_sparql_result(source, terms=None):
+    """Incrementally parse a SPARQL XML result document.
+
+    source is a file-like object, like an HTTP response, or a string.
+    A binding dict is yielded for every result as soon as it is read, and
+    the parsed elements are discarded, so memory use does not depend on
+    the number of results. For an ASK query result a boolean is yielded.
+    """
+    if isinstance(source, str):
+        source = to_bytes(source)
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+
+    intern = str if terms is None else terms.intern
+    tags = ('{%s}result' % SPARQL_NS, '{%s}boolean' % SPARQL_NS)
+    for event, elem in etree.iterparse(source, tag=tags):
+        if elem.tag == tags[0]:
+            yield _parse_result(elem, intern)
+        else:
+            yield (elem.text or '').strip() == 'true'
+        # free the results that have been handled
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+
+def _parse_result(result, intern):
+    data = {}
+    for binding in result:
+        name = intern(binding.attrib['name'])
+        for value in binding:
+            type = value.tag.split('}')[-1]
+            lang = value.attrib.get('{http://www.w3.org/XML/1998/namespace}lang')
+            datatype = value.attrib.get('datatype')
+            text = value.text
+            if text is not None and not isinstance(text, str):
+                text = text.decode('utf8')
+
+            if type == 'uri':
+                # allegro graph returns context uri's with <> chars
+                if text.startswith('<'):
+                    text = text[1:]
+                if text.endswith('>'):
+                    text = text[:-1]
+            if type != 'literal' and text is not None:
+                text = intern(text)
+
+            data[name] = {'value': text,
+                          'type': type}
+            if not lang is None:
+                # w3c sparql json result spec says 'xml:lang',
+                # we use 'lang' instead, just like the dict serialization
+                data[name]['lang'] = intern(lang)
+            if not datatype is None:
+                data[name]['datatype'] = intern(datatype)
+                # w3c sparql json result spec says 'type' should not be
+                # 'literal', but 'typed-literal', we don't do this
+
+                # data[name]['type'] = 'typed-literal'
+    return data
+
+
+def iter_sparql_json(source, terms=None):
+    """Parse a SPARQL JSON result document.
+
+    Yields the same binding dicts (or boolean) as iter_sparql_result. The
+    document is decoded at once, JSON can not be read incrementally.
+    """
+    if hasattr(source, 'read'):
+        doc = simplejson.load(source)
+    else:
+        doc = simplejson.loads(source)
+    if 'boolean' in doc:
+        yield bool(doc['boolean'])
+        return
+
+    intern = str if terms is None else terms.intern
+    for binding in doc['results']['bindings']:
+        data = {}
+        for name, term in binding.items():
+            type = term['type']
+            if type == 'typed-literal':
+                type = 'literal'
+            if type == 'literal':
+                value = {'value': term['value'], 'type': type}
             else:
-                return False
-    return results
+                value = {'value': intern(term['value']), 'type': type}
+            if 'xml:lang' in term:
+                value['lang'] = intern(term['xml:lang'])
+            if 'datatype' in term:
+                value['datatype'] = intern(term['datatype'])
+            data[intern(name)] = value
+        yield data
+
+
+r_tsv_number = re.compile(
+    r'[+-]?(?:(\d+)|(\d*\.\d+)|((?:\d+\.?\d*|\.\d+)[eE][+-]?\d+))$')
+
+
+def iter_sparql_tsv(source, terms=None):
+    """Incrementally parse a SPARQL TSV result document.
+
+    Yields the same binding dicts as iter_sparql_result, one per line.
+    """
+    if isinstance(source, str):
+        source = StringIO(source)
+    elif isinstance(source, bytes):
+        source = BytesIO(source)
+
+    intern = str if terms is None else terms.intern
+    lines = ntriples.readlines(source)
+    header = next(lines, '')
+    names = [intern(name.lstrip('?$')) for name in header.split('\t')]
+    for line in lines:
+        # an empty line is a row without bound variables
+        data = {}
+        for name, term in zip(names, line.split('\t')):
+            if term:
+                data[name] = _parse_tsv_term(term, intern)
+        yield data
+
+
+def _parse_tsv_term(term, intern):
+    if term.startswith('<'):
+        return {'value': intern(ntriples.unquote(term[1:-1])), 'type': 'uri'}
+    elif term.startswith('_:'):
+        return {'value': intern(term[2:]), 'type': 'bnode'}
+    elif term.startswith('"'):
+        m = ntriples.r_literal.match(term)
+        if not m or m.end() != len(term):
+            raise ValueError('Invalid literal: %s' % term)
+        literal, lang, datatype = m.groups()
+        value = {'value': ntriples.unquote(literal), 'type': 'literal'}
+        if lang:
+            value['lang'] = intern(lang)
+        elif datatype:
+            value['datatype'] = intern(ntriples.unquote(datatype))
+        return value
+
+    # turtle shorthand for numbers and booleans
+    if term in ('true', 'false'):
+        datatype = 'boolean'
+    else:
+        m = r_tsv_number.match(term)
+        if not m:
+            raise ValueError('Invalid term: %s' % term)
+        integer, decimal, double = m.groups()
+        datatype = 'integer' if integer else 'decimal' if decimal else 'double'
+    return {'value': term, 'type': 'literal', 'datatype': intern(XSD_NS + datatype)}
+
 
+SPARQL_RESULT_PARSERS = {
+    'application/sparql-results+xml': iter_sparql_result,
+    'application/sparql-results+json': iter_sparql_json,
+    'text/tab-separated-values': iter_sparql_tsv,
+}
 
-def ntriples_to_dict(file):
+
+def sparql_result_parser(content_type):
+    """Returns the result parser for a content type, defaulting to xml"""
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    return SPARQL_RESULT_PARSERS.get(mimetype, iter_sparql_result)
+
+
+@instrumented('utils.ntriples_to_dict')
+def ntriples_to_dict(file, parallel=None, terms=None):
     """This needs a byte stream
+
+    With ``parallel`` set to a number of worker processes (or True for
+    one per core), the input is split on line boundaries and the parts
+    are parsed concurrently. This pays off for large files.
+
+    Terms are interned in the ``terms`` TermDict, if given.
     """
+    if parallel:
+        data = _ntriples_to_dict_parallel(
+            file, None if parallel is True else parallel)
+        if terms is not None:
+            data = intern_dict(data, terms)
+    else:
+        data = _ntriples_to_dict(file, terms=terms)
+    if instrument.enabled():
+        instrument.record(triples=sum(len(values)
+                                      for predicates in data.values()
+                                      for values in predicates.values()))
+    return data
+
+
+def _ntriples_to_dict(file, bnode_prefix=None, terms=None):
+    # the parser's terms are lightweight str and tuple subclasses, they are
+    # stored as plain (compact) strings without intermediate objects
+    URI, BNode, Literal = ntriples.URI, ntriples.BNode, ntriples.Literal
+    term = str if terms is None else terms.intern
+
     class TripleDict(dict):
         def triple(self, s, p, o):
-            if isinstance(s, ntriples.URI):
-                subject = s.toPython()
-            elif isinstance(s, ntriples.bNode):
-                subject = u'_:%s' % s.toPython()
+            cls = type(s)
+            if cls is URI:
+                subject = term(s)
+            elif cls is BNode:
+                subject = term(u'_:' + s)
             else:
                 raise ValueError('Unknown subject type: %s' % type(s))
-            predicate = p.toPython()
-            predicates = self.get(subject, {})
-            values = predicates.get(predicate, [])
-            value = {'value': str(o)}
-            if isinstance(o, ntriples.URI):
-                value['type'] = 'uri'
-            elif isinstance(o, ntriples.bNode):
-                value['type'] = 'bnode'
-            elif isinstance(o, ntriples.Literal):
-                o: ntriples.Literal
-                lang, dtype, literal = o.language, o.datatype, str(o)
-                value['type'] = 'literal'
-                value['value'] = literal
-                if lang:
-                    value['lang'] = lang
-                elif dtype:
-                    value['datatype'] = dtype.toPython()
+            predicates = self.get(subject)
+            if predicates is None:
+                predicates = self[subject] = {}
+            values = predicates.get(p)
+            if values is None:
+                values = predicates[term(p)] = []
+
+            cls = type(o)
+            if cls is URI:
+                value = {'value': term(o), 'type': 'uri'}
+            elif cls is BNode:
+                value = {'value': term(o), 'type': 'bnode'}
+            elif cls is Literal:
+                value = {'value': o.value, 'type': 'literal'}
+                if o.language:
+                    value['lang'] = term(o.language)
+                elif o.datatype:
+                    value['datatype'] = term(o.datatype)
             else:
                 raise ValueError('Unknown object type: %s' % type(o))
-
             values.append(value)
-            self[subject] = predicates
-            predicates[predicate] = values
 
-    parser = ntriples.NTriplesParser(TripleDict())
+    parser = ntriples.NTriplesParser(TripleDict(), bnode_prefix=bnode_prefix)
     # result = parser.parse(BytesIO(file.read().encode('utf-8')))
     result = parser.parse(file)
     return dict(result)
 
 
-def to_bytes(data: str) -> bytes:
-    return bytes(data.encode('utf-8'))
+def _ntriples_range_to_dict(source, start, end, bnode_prefix):
+    if isinstance(source, bytes):
+        data = source[start:end]
+    else:
+        data = ntriples.read_range(source, start, end)
+    return _ntriples_to_dict(BytesIO(data), bnode_prefix)
 
-def dict_to_ntriples(data, *bnodes):
-    # result = StringIO()
-    def translate(data):
+
+def _ntriples_to_dict_parallel(file, workers=None):
+    # only a plain file read from its start can be mapped by its path,
+    # a compressed file has a name and fileno as well
+    if (isinstance(file, BufferedReader) and
+            isinstance(getattr(file, 'raw', None), FileIO) and
+            isinstance(file.name, str) and file.tell() == 0):
+        source = file.name
+    else:
+        source = file.read()
+        if isinstance(source, str):
+            source = to_bytes(source)
+
+    result = {}
+    for data in ntriples.map_parallel(_ntriples_range_to_dict, source, workers):
         for subject, predicates in data.items():
-            if not subject.startswith('_:'):
-                subject = '<%s>' % subject
+            if subject not in result:
+                result[subject] = predicates
+                continue
+            merged = result[subject]
             for predicate, values in predicates.items():
-                predicate = '<%s>' % predicate
-                for value in values:
-                    if value['type'] == 'uri':
-                        obj = f'<{value["value"]}>'
-                    elif value['type'] == 'bnode':
-                        obj = f'_:{value["value"]}'
-                    else:
-                        obj = value['value']
-                        obj = obj.replace('\\', '\\\\')
-                        obj = obj.replace('\t', '\\t')
-                        obj = obj.replace('\n', '\\n')
-                        obj = obj.replace('\r', '\\r')
-                        obj = obj.replace('\"', '\\"')
-                        obj = f'"{obj}"'
-                        if value.get('lang'):
-                            obj = f'{obj}@{(value["lang"])}'
-                        elif value.get('datatype'):
-                            obj = '%s^^<%s>' % (obj, (value['datatype']))
-                    # result.write(to_bytes('%s %s %s .\n' % (subject, predicate, obj)))
-                    yield subject, predicate, obj
-                    # result.write('%s %s %s .\n' % (subject, predicate, obj))
-
-    def take(n, xs):
-        it = iter(xs)
-        for _ in range(n):
-            yield next(it)
-
-    def group(n, it):
-        yield tuple(take(3, it))
-
-    def as_byte_stream(ts):
-        return BytesIO(b'\n'.join(to_bytes('%s %s %s .\n' % t) for t in ts))
-
-    if bnodes:
-        # Expand bnodes
-        bn = iter(bnodes)
-        maybe_subst = lambda x: f'_:{next(bn)}' if x.startswith('_:') else x
-        ts = group(3, [maybe_subst(x) for t in translate(data) for x in t])
-        return as_byte_stream(ts)
+                merged.setdefault(predicate, []).extend(values)
+    return result
+
+
+# In N-Quads, contexts are the graphs named <context:NAME>,
+# the same IRIs the sesame backend uses
+CONTEXT_PREFIX = 'context:'
+
+
+def context_name(graph):
+    """Returns the context name for a graph IRI"""
+    if graph.startswith(CONTEXT_PREFIX):
+        return graph[len(CONTEXT_PREFIX):]
+    return graph
+
+
+@instrumented('utils.nquads_to_ntriples')
+def nquads_to_ntriples(file):
+    """Split an N-Quads byte stream into N-Triples per context.
+
+    Returns a dict mapping context names, or None for the default graph,
+    to byte streams with the statements in that context. The whole input
+    is held in memory, iter_graphs splits it while it is read.
+    """
+    graphs = {}
+    for name, triples in iter_graphs(file):
+        out = graphs.get(name)
+        if out is None:
+            out = graphs[name] = BytesIO()
+        out.write(triples.read())
+    for out in graphs.values():
+        out.seek(0)
+    return graphs
+
+
+def iter_graphs(file):
+    """Yield (context name, N-Triples stream) pairs for the runs of
+    statements in the same graph of an N-Quads byte stream.
+
+    The context name is None for the default graph. The statements are
+    converted while the stream is read, in blocks of about bufsiz; the
+    part of a stream that is not read when the next pair is taken is
+    skipped. A graph whose statements are not adjacent in the input is
+    yielded once for every run.
+    """
+    quads = ntriples.iter_quads(file)
+    pending = [next(quads, None)]
+
+    def run(graph):
+        serialize = ntriples.serialize
+        lines, size = [], 0
+        while pending[0] is not None and pending[0][3] == graph:
+            s, p, o, g = pending[0]
+            line = '%s %s %s .\n' % (serialize(s), serialize(p), serialize(o))
+            lines.append(line)
+            size += len(line)
+            if size >= ntriples.bufsiz:
+                yield ''.join(lines).encode('utf-8')
+                lines, size = [], 0
+            pending[0] = next(quads, None)
+        if lines:
+            yield ''.join(lines).encode('utf-8')
+
+    while pending[0] is not None:
+        graph = pending[0][3]
+        chunks = run(graph)
+        yield (None if graph is None else context_name(graph),
+               IterStream(chunks))
+        for chunk in chunks:
+            pass
+
+
+def ntriples_to_nquads(file, context_name):
+    """Yield the statements in file, an N-Triples stream, as N-Quads lines
+    in the graph of the context.
+
+    The statements are parsed, so comments are left out.
+    """
+    label = '<%s%s>' % (CONTEXT_PREFIX, context_name)
+    serialize = ntriples.serialize
+    for s, p, o in ntriples.iter_triples(file):
+        yield '%s %s %s %s .\n' % (serialize(s), serialize(p), serialize(o),
+                                    label)
+
+
+def to_bytes(data: str) -> bytes:
+    return bytes(data.encode('utf-8'))
+
+
+def value_to_ntriples(value):
+    """Returns a value dict as an N-Triples term"""
+    type = value['type']
+    if type == 'uri':
+        return '<%s>' % value['value']
+    elif type == 'bnode':
+        return '_:%s' % value['value']
+    term = '"%s"' % value['value'].translate(ntriples.escape_table)
+    if value.get('lang'):
+        return '%s@%s' % (term, value['lang'])
+    elif value.get('datatype'):
+        return '%s^^<%s>' % (term, value['datatype'])
+    return term
+
+
+# the tokens of a query that can hold braces, and the braces themselves
+r_sparql_token = re.compile('|'.join((
+    r'"""(?:[^"\\]|\\.|"(?!""))*"""',
+    r"'''(?:[^'\\]|\\.|'(?!''))*'''",
+    r'"(?:[^"\\\n]|\\.)*"',
+    r"'(?:[^'\\\n]|\\.)*'",
+    r'<[^<>"{}|^`\\\x00-\x20]*>',  # an IRI, not a comparison
+    r'#[^\n]*',
+    r'[{}]',
+    r'\bVALUES\b')), re.I | re.S)
+
+
+def _where_end(sparql):
+    """Returns the offset of the closing brace of the WHERE group, the
+    last group of the query that is not a trailing VALUES clause
+    """
+    depth, end, values, inline = 0, None, False, False
+    for match in r_sparql_token.finditer(sparql):
+        token = match.group()
+        if token == '{':
+            if depth == 0:
+                inline, values = values, False
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if depth == 0 and not inline:
+                end = match.start()
+        elif depth == 0 and token.upper() == 'VALUES':
+            values = True
+    return end
+
+
+def bind_values(sparql, bindings):
+    """Returns a query with variables bound by a VALUES clause at the end
+    of its WHERE group, so they are bound before any grouping.
+
+    `bindings` maps variable names to value dicts. Blank nodes can not be
+    bound this way, SPARQL does not allow them in VALUES.
+    """
+    if not bindings:
+        return sparql
+    names = list(bindings)
+    terms = []
+    for name in names:
+        if bindings[name]['type'] == 'bnode':
+            raise ValueError('Can not bind ?%s to a blank node' % name)
+        terms.append(value_to_ntriples(bindings[name]))
+    end = _where_end(sparql)
+    if end is None:
+        raise ValueError('Can not bind variables, the query has no WHERE '
+                         'group')
+    # on a line of its own, after a comment that may end the group
+    return '%s\nVALUES (%s) { (%s) }\n%s' % (
+        sparql[:end].rstrip(), ' '.join('?' + name for name in names),
+        ' '.join(terms), sparql[end:])
+
+
+class IterStream(RawIOBase):
+    """A readable byte stream over an iterable of byte strings.
+
+    The chunks are pulled from the iterable as they are read, so a
+    generator can produce a large stream without holding it in memory.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._chunk = b''
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._offset >= len(self._chunk):
+            self._chunk = next(self._chunks, None)
+            self._offset = 0
+            if self._chunk is None:
+                self._chunk = b''
+                return 0
+        size = min(len(b), len(self._chunk) - self._offset)
+        b[:size] = self._chunk[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+    def close(self):
+        # a generator is closed, so it can release what it reads from
+        close = getattr(self._chunks, 'close', None)
+        if close is not None:
+            close()
+        self._chunks = iter(())
+        super(IterStream, self).close()
+
+
+# openers of compressed files or file objects, by their magic bytes
+DECOMPRESSORS = (
+    (re.compile(b'\x1f\x8b'), gzip.open),
+    (re.compile(b'BZh[1-9]'), bz2.open),
+    (re.compile(b'\xfd7zXZ\x00'), lzma.open),
+)
+
+COMPRESSORS = {
+    'gzip': lambda: zlib.compressobj(wbits=31),
+    'bz2': bz2.BZ2Compressor,
+    'xz': lzma.LZMACompressor,
+}
+
+
+def decompress(file):
+    """Returns a binary file that is decompressed while it is read.
+
+    Gzip, bzip2 and xz data is recognized by its first bytes, other
+    files, and text files, are returned as they are.
+    """
+    if isinstance(file, TextIOBase):
+        return file
+    head, file = _peek(file, 6)
+    for magic, opener in DECOMPRESSORS:
+        if magic.match(head):
+            return opener(file)
+    return file
+
+
+def open_file(path):
+    """Opens a file for binary reading, decompressing it if needed"""
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for magic, opener in DECOMPRESSORS:
+        if magic.match(head):
+            return opener(path)
+    return open(path, 'rb')
+
+
+def _peek(file, size):
+    # returns the first bytes of a file and a file to read from the start
+    if hasattr(file, 'peek'):
+        head = file.peek(size)[:size]
+        if len(head) == size:
+            return head, file
+        # less was buffered, read it and put it back in front
+        head = file.read(size)
+    elif getattr(file, 'seekable', None) and file.seekable():
+        start = file.tell()
+        head = file.read(size)
+        file.seek(start)
+        return head, file
     else:
-        return as_byte_stream(translate(data))
+        head = file.read(size)
+    blocks = iter(lambda: file.read(ntriples.bufsiz), b'')
+    return head, BufferedReader(IterStream(chain([head], blocks)))
+
+
+def is_uri(data):
+    return isinstance(data, str) and data.startswith(
+        ('http://', 'https://', 'file://'))
+
+
+def open_source(data):
+    """Returns a binary file of data given to the add and remove methods.
+
+    data is a http(s):// or file:// URI, a file object or the data itself.
+    Compressed files are decompressed while they are read.
+    """
+    if is_uri(data):
+        if data.startswith('file://'):
+            return open_file(data[7:])
+        # requests is only imported for remote sources
+        from sparrow.fetch import fetch
+        return decompress(fetch(data))
+    elif all(hasattr(data, a) for a in ('read', 'seek', 'close')):
+        return decompress(data)
+    return BytesIO(bytes(data, encoding='utf-8'))
+
+
+def compress(file, compression=None):
+    """Returns a binary file that compresses file while it is read.
+
+    ``compression`` is 'gzip', 'bz2' or 'xz', with None file is returned
+    as it is. Text is encoded in utf-8.
+    """
+    if compression is None:
+        return file
+    if compression not in COMPRESSORS:
+        raise ValueError('Unknown compression: %s' % compression)
+    compressor = COMPRESSORS[compression]()
+
+    def chunks():
+        while True:
+            block = file.read(ntriples.bufsiz)
+            if not block:
+                break
+            if isinstance(block, str):
+                block = block.encode('utf-8')
+            data = compressor.compress(block)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    return IterStream(chunks())
+
+
+def dict_to_ntriples(data, *bnodes):
+    """Returns the triples of a dict as a readable N-Triples byte stream.
+
+    The triples are encoded while the stream is read. Blank node labels are
+    replaced by `bnodes`, in order of appearance, if given.
+    """
+    return IterStream(iter_ntriples(data, *bnodes))
+
+
+def iter_ntriples(data, *bnodes, batch_size=1000):
+    """Encodes the triples of a dict to N-Triples in batches of lines.
+
+    `data` is a dict or an iterable of (subject, predicates) pairs.
+    """
+    escape_table = ntriples.escape_table
+    relabel = iter(bnodes).__next__ if bnodes else None
+    items = data.items() if hasattr(data, 'items') else data
+    lines = []
+    for subject, predicates in items:
+        bnode_subject = subject.startswith('_:')
+        if not bnode_subject:
+            subject = '<%s>' % subject
+        for predicate, values in predicates.items():
+            # the subject and predicate are shared by the whole group
+            prefix = '%s <%s> ' % (subject, predicate)
+            for value in values:
+                if bnode_subject and relabel:
+                    prefix = '_:%s <%s> ' % (relabel(), predicate)
+                type = value['type']
+                if type == 'uri':
+                    obj = '<%s>' % value['value']
+                elif type == 'bnode':
+                    obj = '_:%s' % (relabel() if relabel else value['value'])
+                else:
+                    obj = '"%s"' % value['value'].translate(escape_table)
+                    if value.get('lang'):
+                        obj = '%s@%s' % (obj, value['lang'])
+                    elif value.get('datatype'):
+                        obj = '%s^^<%s>' % (obj, value['datatype'])
+                lines.append(prefix + obj + ' .\n')
+                if len(lines) >= batch_size:
+                    yield ''.join(lines).encode('utf-8')
+                    lines = []
+    if lines:
+        yield ''.join(lines).encode('utf-8')
+
+
+r_json_space = re.compile(r'[ \t\n\r]*')
+
+
+class _JSONReader(object):
+    """Reads JSON values one at a time from a binary or text file"""
+
+    def __init__(self, file):
+        self.file = file
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+        self._decode = codecs.getincrementaldecoder('utf-8')().decode
+        self._decoder = simplejson.JSONDecoder()
+
+    def read(self, size):
+        block = self.file.read(size)
+        if not block:
+            self.eof = True
+            block = self._decode(b'', True)
+        elif not isinstance(block, str):
+            block = self._decode(block)
+        self.text = self.text[self.pos:] + block
+        self.pos = 0
+
+    def peek(self):
+        """Returns the next character that is not whitespace"""
+        while True:
+            self.pos = r_json_space.match(self.text, self.pos).end()
+            if self.pos < len(self.text) or self.eof:
+                return self.text[self.pos:self.pos + 1]
+            self.read(ntriples.bufsiz)
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('Expecting %r at character %d' % (char, self.pos))
+        self.pos += 1
+
+    def value(self):
+        # a value split over blocks fails to decode, it is retried with
+        # twice as much data until it is complete
+        size = ntriples.bufsiz
+        while True:
+            self.peek()
+            try:
+                value, self.pos = self._decoder.raw_decode(self.text, self.pos)
+                return value
+            except simplejson.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.read(size)
+            size *= 2
+
+
+def iter_json_dict(file):
+    """Incrementally parse a JSON document in the dict format.
+
+    Yields (subject, predicates) pairs while the file is read, only one
+    subject is decoded at a time.
+    """
+    reader = _JSONReader(file)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        subject = reader.value()
+        if not isinstance(subject, str):
+            raise ValueError('Expecting a subject at character %d' % reader.pos)
+        reader.expect(':')
+        yield subject, reader.value()
+        if reader.peek() == '}':
+            break
+        reader.expect(',')
 
 
 def json_to_ntriples(data):
-    data = simplejson.load(data)
-    return dict_to_ntriples(data)
+    """Returns a JSON document as an N-Triples stream, converted while read.
+
+    The start of the document is checked before returning.
+    """
+    subjects = iter_json_dict(data)
+    first = next(subjects, None)
+    if first is not None:
+        subjects = chain([first], subjects)
+    return IterStream(iter_ntriples(subjects))
+
+
+def ntriples_to_json(triples, indent=True):
+    """Returns N-Triples as a JSON text stream, written while it is read.
+
+    Each subject is written as soon as its triples are complete, see
+    iter_subjects. `indent` is passed on to simplejson, None writes
+    compact JSON.
+    """
+    chunks = _iter_json(iter_subjects(triples), indent)
+    return TextIOWrapper(BufferedReader(IterStream(chunks)), encoding='utf-8')
+
+
+def _iter_json(items, indent):
+    # each subject is dumped as an object of its own, of which the braces
+    # are left out, so the document equals simplejson.dumps(dict(items))
+    if indent is None:
+        separator, end = ', ', '}'
+    else:
+        separator, end = ',', '\n}'
+    parts, size, first = ['{'], 0, True
+    for subject, predicates in items:
+        text = simplejson.dumps({subject: predicates}, indent=indent)
+        if not first:
+            parts.append(separator)
+        first = False
+        parts.append(text[1:-len(end)])
+        size += len(text)
+        if size >= ntriples.bufsiz:
+            yield ''.join(parts).encode('utf-8')
+            parts, size = [], 0
+    parts.append('}' if first else end)
+    yield ''.join(parts).encode('utf-8')
+
+
+r_subject = re.compile(r'[ \t]*(<[^>]*>|_:[^ \t<]+)')
+
+
+def _subject_key(line):
+    # the subject of an N-Triples line, None for comments and empty lines
+    m = r_subject.match(line)
+    return m.group(1) if m else None
+
+
+def iter_subjects(file, buckets=64):
+    """Yields the (subject, predicates) pairs of N-Triples in dict format.
+
+    Backends usually write the triples of a subject together, then each
+    subject is yielded as soon as it is complete. A seekable file is first
+    scanned to check this. Otherwise the lines are spilled to `buckets`
+    temporary files by subject, which are read back one at a time.
+    """
+    # blank node labels have to agree between the parts that are parsed
+    bnode_prefix = 'N%s' % uuid4().hex
+    if _is_grouped(file):
+        return _iter_grouped(file, bnode_prefix)
+    return _iter_spilled(file, bnode_prefix, buckets)
+
+
+def _is_grouped(file):
+    if not (hasattr(file, 'seekable') and file.seekable()):
+        return False
+    start = file.tell()
+    # hashes are enough, a collision only takes the slower path
+    seen = set()
+    last = None
+    try:
+        for line in ntriples.readlines(file):
+            subject = _subject_key(line)
+            if subject is None or subject == last:
+                continue
+            key = hash(subject)
+            if key in seen:
+                return False
+            seen.add(key)
+            last = subject
+        return True
+    finally:
+        file.seek(start)
+
+
+def _iter_grouped(file, bnode_prefix):
+    # lines are parsed in batches that end at a change of subject
+    batch, size, last = [], 0, None
+    for line in ntriples.readlines(file):
+        subject = _subject_key(line)
+        if subject is None:
+            continue
+        if subject != last and size >= ntriples.bufsiz:
+            yield from _ntriples_lines_to_dict(batch, bnode_prefix).items()
+            batch, size = [], 0
+        batch.append(line)
+        size += len(line)
+        last = subject
+    if batch:
+        yield from _ntriples_lines_to_dict(batch, bnode_prefix).items()
+
+
+def _iter_spilled(file, bnode_prefix, buckets):
+    files = [TemporaryFile('w+', encoding='utf-8') for i in range(buckets)]
+    try:
+        for line in ntriples.readlines(file):
+            subject = _subject_key(line)
+            if subject is not None:
+                files[hash(subject) % buckets].write(line + '\n')
+        for f in files:
+            f.seek(0)
+            yield from _ntriples_to_dict(f, bnode_prefix).items()
+            f.close()
+    finally:
+        for f in files:
+            f.close()
 
 
-def ntriples_to_json(triples):
-    data = ntriples_to_dict(triples)
-    return StringIO(simplejson.dumps(data, indent=True))
+def _ntriples_lines_to_dict(lines, bnode_prefix):
+    lines.append('')
+    return _ntriples_to_dict(StringIO('\n'.join(lines)), bnode_prefix)